@@ -1,10 +1,68 @@
-from rdflib import Literal
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
+from cache import Cache
+from loader import ChunkedCsv
+from output import ShardedWriter, StatementWriter, open_output
+from parallel import WorkerPool
 
-class RDF:
-    def __init__(self, graph_name: str) -> None:
-        self.rdf_text = f"@base <http://{graph_name}/> . \n\n"
+class RDF(StatementWriter):
+    # a blank line after the statements of every table
+    table_separator = "\n"
+
+    def __init__(
+        self,
+        graph_name: str | None,
+        file_path: str | None = None,
+        flush_size: int = 2**20,
+        cache: Cache | None = None,
+        compression: str | None = None,
+        max_shard_size: int | None = None,
+        max_shard_rows: int | None = None,
+        group_edges: bool = False,
+    ) -> None:
+        # when a file_path is given statements are written to it as they are added,
+        # once more than flush_size characters are buffered, instead of being kept
+        # in memory until write_rdf_file. With a cache the statements of every
+        # table are kept in it and reused while the table's csv is unchanged. Without
+        # a graph_name the @base directive is left out, e.g. for a fragment of a graph.
+        # With a compression the file is compressed on a background thread. With a
+        # max_shard_size or max_shard_rows the file is split into numbered shards
+        # that each start with the @base directive. With group_edges the relations of
+        # a subject are written as a single statement (see
+        # get_grouped_node_connection_statements)
+
+        base = f"@base <http://{graph_name}/> . \n\n" if graph_name is not None else ""
+        max_text_size = None
+
+        if file_path is None:
+            file = None
+        elif max_shard_size is None and max_shard_rows is None:
+            file = open_output(file_path, compression)
+        else:
+            # cached statements are read back in blocks that can end within a
+            # statement, so the statements of a sharded file are always generated.
+            # The statements of a chunk are split into pieces that fit in a shard
+            # after its @base directive
+            file = ShardedWriter(
+                file_path, max_shard_size, max_shard_rows, base, compression
+            )
+
+            if max_shard_size is not None:
+                max_text_size = max_shard_size - ShardedWriter.get_size(base)
+
+            base = ""
+            cache = None
+
+        super().__init__(file, flush_size, cache, max_text_size)
+        self.group_edges = group_edges
+
+        if base:
+            self.add_text(base)
+
+    @property
+    def rdf_text(self) -> str:
+        return self.text
 
     def hypenate_spaces(self, val: any) -> str | None:
         if type(val) == str:
@@ -14,6 +72,83 @@ class RDF:
         else:
             return None
 
+    def hypenate_spaces_column(self, values: pd.Series) -> pd.Series:
+        # vectorised hypenate_spaces, non string values are formatted with str() which
+        # never gives spaces or underscores so every value can be hyphenated as text.
+        # Ids repeat across rows (every relation of a node) so each distinct value is
+        # only hyphenated once and mapped back to its rows
+
+        codes, uniques = pd.factorize(values.astype(str))
+        hyphenated = pd.Series(uniques).str.replace(" ", "-").str.replace("_", "-")
+
+        return pd.Series(hyphenated.to_numpy()[codes], index=values.index, dtype=object)
+
+    def get_str_mask(self, values: pd.Series) -> pd.Series:
+        if values.dtype != object:
+            return pd.Series(False, index=values.index)
+
+        if pd.api.types.infer_dtype(values, skipna=False) == "string":
+            return pd.Series(True, index=values.index)
+
+        return values.map(type) == str
+
+    def get_literal_column(self, values: pd.Series) -> pd.Series:
+        # vectorised equivalent of Literal(val).n3() for string values and f'"{val}"'
+        # for every other value, escaping follows rdflib's Literal._quote_encode
+
+        is_str = self.get_str_mask(values)
+        literals = '"' + values.astype(str) + '"'
+
+        if not is_str.any():
+            return literals
+
+        is_multiline = is_str & (
+            values.str.contains("\n", regex=False).fillna(False).astype(bool)
+        )
+        is_single_line = is_str & ~is_multiline
+
+        literals[is_single_line] = (
+            '"'
+            + values[is_single_line]
+            .str.replace("\\", "\\\\", regex=False)
+            .str.replace('"', '\\"', regex=False)
+            .str.replace("\r", "\\r", regex=False)
+            + '"'
+        )
+
+        multi_line = (
+            values[is_multiline]
+            .str.replace("\\", "\\\\", regex=False)
+            .str.replace('"""', '\\"\\"\\"', regex=False)
+        )
+        ends_with_quote = multi_line.str.endswith('"') & ~multi_line.str.endswith('\\"')
+        multi_line[ends_with_quote] = multi_line[ends_with_quote].str[:-1] + '\\"'
+        literals[is_multiline] = (
+            '"""' + multi_line.str.replace("\r", "\\r", regex=False) + '"""'
+        )
+
+        return literals
+
+    def get_line_literal_column(self, values: pd.Series) -> pd.Series:
+        # literals for N-Triples, which has no long strings so line breaks are always
+        # escaped, following rdflib's nt serializer
+
+        is_str = self.get_str_mask(values)
+        literals = '"' + values.astype(str) + '"'
+
+        if is_str.any():
+            literals[is_str] = (
+                '"'
+                + values[is_str]
+                .str.replace("\\", "\\\\", regex=False)
+                .str.replace("\n", "\\n", regex=False)
+                .str.replace('"', '\\"', regex=False)
+                .str.replace("\r", "\\r", regex=False)
+                + '"'
+            )
+
+        return literals
+
     def get_turtle_statement(
         self, subject: str, predicate_to_objects: dict[str, str]
     ) -> str:
@@ -46,58 +181,281 @@ class RDF:
         return statement
 
     def add_node(
-        self, df: pd.DataFrame, id_field_name: str, subject_type: str, progress_bar: tqdm
+        self,
+        df: pd.DataFrame | ChunkedCsv,
+        id_field_name: str,
+        subject_type: str,
+        progress_bar: tqdm,
+        pool: WorkerPool | None = None,
     ) -> None:
-        rdf = ""
+        self.add_tables(
+            self.get_node_statements,
+            {subject_type: df},
+            lambda *_: (id_field_name, subject_type),
+            progress_bar,
+            pool,
+        )
 
-        for _, row in df.iterrows():
-            subject = f"<{self.hypenate_spaces(subject_type)}/{self.hypenate_spaces(row[id_field_name])}/>"
-            predicate_to_objects = {}
+    def add_nodes(
+        self,
+        node_dfs: dict[str, pd.DataFrame | ChunkedCsv],
+        progress_bar: tqdm,
+        pool: WorkerPool | None = None,
+    ) -> None:
+        # the first column of every node table is its id
+
+        self.add_tables(
+            self.get_node_statements,
+            node_dfs,
+            lambda df_name, df: (df.columns[0], df_name),
+            progress_bar,
+            pool,
+        )
+
+    def get_node_terms(
+        self, df: pd.DataFrame, id_field_name: str, subject_type: str
+    ) -> tuple[pd.Series, dict[str, pd.Series]]:
+        # the subject iri (relative to the graph's base) of every row and its values
+        # per predicate, each row's values are cast to the dtype they would have as a
+        # row of df.values so the text matches what was produced when iterating over
+        # the rows
 
-            for column in df.columns:
-                if column == id_field_name:
-                    continue
+        row_dtype = df.head(0).values.dtype
 
-                subject_val = row[column]
+        subjects = (
+            f"{self.hypenate_spaces(subject_type)}/"
+            + self.hypenate_spaces_column(df[id_field_name].astype(row_dtype))
+            + "/"
+        )
+        predicate_values = {
+            column: df[column].astype(row_dtype)
+            for column in df.columns
+            if column != id_field_name
+        }
 
-                if type(subject_val) == str:
-                    subject_val = Literal(subject_val).n3()
-                    predicate_to_objects[column] = [subject_val]
-                else:
-                    predicate_to_objects[column] = [f'"{subject_val}"']
+        return subjects, predicate_values
+
+    def get_node_statements(
+        self, df: pd.DataFrame, id_field_name: str, subject_type: str
+    ) -> str:
+        # statements are built a column at a time
 
-            rdf += self.get_turtle_statement(subject, predicate_to_objects) + "\n"
-            progress_bar.update(1)
+        subjects, predicate_values = self.get_node_terms(
+            df, id_field_name, subject_type
+        )
 
-        self.rdf_text += rdf + "\n"
+        predicate_objects = [
+            f"<{column}> " + self.get_literal_column(values) + " "
+            for column, values in predicate_values.items()
+        ]
 
-    def add_node_connections(self, df: pd.DataFrame, progress_bar: tqdm) -> None:
-        rdf = ""
+        statements = "<" + subjects + "> "
+
+        for i, objects in enumerate(predicate_objects):
+            statements += objects if i == 0 else ";\n    " + objects
+
+        return "".join((statements + ".\n\n").tolist())
+
+    def get_node_lines(
+        self,
+        df: pd.DataFrame,
+        id_field_name: str,
+        subject_type: str,
+        base: str,
+        context: str | None = None,
+    ) -> str:
+        # N-Triples (or with a context N-Quads) of the same statements as
+        # get_node_statements, one self-contained line per triple with absolute iris
+
+        subjects, predicate_values = self.get_node_terms(
+            df, id_field_name, subject_type
+        )
+
+        graph_label = f" <{context}>" if context is not None else ""
+        subjects = f"<{base}" + subjects + "> "
+        lines = [
+            subjects
+            + f"<{base}{column}> "
+            + self.get_line_literal_column(values)
+            + graph_label
+            + " .\n"
+            for column, values in predicate_values.items()
+        ]
+
+        if not lines:
+            return ""
+
+        # the lines of a subject are kept together
+
+        return "".join(np.column_stack(lines).ravel().tolist())
+
+    def add_node_connections(
+        self,
+        df: pd.DataFrame | ChunkedCsv,
+        progress_bar: tqdm,
+        pool: WorkerPool | None = None,
+    ) -> None:
+        self.add_nodes_connections({"": df}, progress_bar, pool)
+
+    def add_nodes_connections(
+        self,
+        relation_dfs: dict[str, pd.DataFrame | ChunkedCsv],
+        progress_bar: tqdm,
+        pool: WorkerPool | None = None,
+    ) -> None:
+        self.add_tables(
+            (
+                self.get_grouped_node_connection_statements
+                if self.group_edges
+                else self.get_node_connection_statements
+            ),
+            relation_dfs,
+            lambda *_: (),
+            progress_bar,
+            pool,
+            self.group_edges,
+        )
+
+    def get_node_connection_terms(
+        self, df: pd.DataFrame
+    ) -> tuple[pd.Series, pd.Series | str, pd.Series]:
+        # the subject, predicate and object iris (relative to the graph's base) of
+        # every relation
 
         hasCollectionField = len(df.columns) == 3
 
         subject_type = df.columns[0].replace("_id", "")
+        row_dtype = df.head(0).values.dtype
+
+        subjects = (
+            f"{self.hypenate_spaces(subject_type)}/"
+            + self.hypenate_spaces_column(df[df.columns[0]].astype(row_dtype))
+            + "/"
+        )
+
+        if hasCollectionField:
+            predicate_types = self.hypenate_spaces_column(
+                df["collection"].astype(row_dtype)
+            )
+            objects = (
+                predicate_types
+                + "/"
+                + self.hypenate_spaces_column(df["id"].astype(row_dtype))
+                + "/"
+            )
+        else:
+            predicate_types = self.hypenate_spaces(
+                df.columns[1].replace("_id", "").lower()
+            )
+            objects = (
+                f"{predicate_types}/"
+                + self.hypenate_spaces_column(df[df.columns[1]].astype(row_dtype))
+                + "/"
+            )
+
+        return subjects, predicate_types, objects
+
+    def get_node_connection_statements(self, df: pd.DataFrame) -> str:
+        subjects, predicate_types, objects = self.get_node_connection_terms(df)
+
+        statements = (
+            "<" + subjects + "> <" + predicate_types + "> <" + objects + "> .\n\n"
+        )
+
+        return "".join(statements.tolist())
+
+    @staticmethod
+    def get_adjacency(
+        subject_codes: np.ndarray, predicate_codes: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # CSR adjacency of relations given as subject and predicate codes: the order
+        # of the rows grouped by subject and within a subject by predicate, then the
+        # offsets into it where the rows of every subject and of every predicate of
+        # a subject start, each followed by the number of rows. Subjects and the
+        # predicates of a subject are in the order of their first row
 
-        for _, row in df.iterrows():
-            subject_uri = f"<{self.hypenate_spaces(subject_type)}/{self.hypenate_spaces(row[df.columns[0]])}/>"
-            predicate_to_objects = {}
+        pair_codes, _ = pd.factorize(
+            subject_codes * (int(predicate_codes.max(initial=0)) + 1) + predicate_codes
+        )
+        order = np.lexsort((pair_codes, subject_codes))
 
-            if hasCollectionField:
-                predicate_type = self.hypenate_spaces(row["collection"])
-                predicate_to_objects[predicate_type] = [
-                    f"<{predicate_type}/{self.hypenate_spaces(row['id'])}/>"
-                ]
-            else:
-                predicate_type = self.hypenate_spaces(df.columns[1].replace("_id", "").lower())
-                predicate_to_objects[predicate_type] = [
-                    f"<{predicate_type}/{self.hypenate_spaces(row[df.columns[1]])}/>"
-                ]
+        def get_offsets(codes: np.ndarray) -> np.ndarray:
+            is_start = np.empty(len(codes), dtype=bool)
+            is_start[:1] = True
+            is_start[1:] = codes[1:] != codes[:-1]
 
-            rdf += self.get_turtle_statement(subject_uri, predicate_to_objects) + "\n"
-            progress_bar.update(1)
+            return np.append(np.flatnonzero(is_start), len(codes))
 
-        self.rdf_text += rdf + "\n"
+        return order, get_offsets(subject_codes[order]), get_offsets(pair_codes[order])
 
-    def write_rdf_file(self, dir_path: str, file_name: str = "rdf") -> None:
-        with open(f"{dir_path}/{file_name}.ttl", "w") as text_file:
+    def get_grouped_node_connection_statements(self, df: pd.DataFrame) -> str:
+        # the relations of a chunk with every subject written once, followed by its
+        # predicates and their comma separated objects. A subject with a single
+        # relation gives the same statement as get_node_connection_statements
+
+        if len(df) == 0:
+            return ""
+
+        subjects, predicate_types, objects = self.get_node_connection_terms(df)
+
+        subject_codes, subject_iris = pd.factorize(subjects, use_na_sentinel=False)
+
+        if isinstance(predicate_types, str):
+            predicate_codes = np.zeros(len(df), dtype=np.intp)
+            predicate_iris = np.array([predicate_types], dtype=object)
+        else:
+            predicate_codes, predicate_iris = pd.factorize(
+                predicate_types, use_na_sentinel=False
+            )
+
+        order, subject_offsets, predicate_offsets = self.get_adjacency(
+            subject_codes, predicate_codes
+        )
+
+        subject_codes = subject_codes[order]
+        predicate_iris = np.asarray(predicate_iris, dtype=object)[
+            predicate_codes[order]
+        ]
+        subject_iris = np.asarray(subject_iris, dtype=object)[subject_codes]
+
+        # every object is preceded by a comma, the objects of a predicate by the
+        # predicate and those of a subject by the subject
+
+        prefixes = np.full(len(df), ", ", dtype=object)
+        starts = predicate_offsets[:-1]
+        prefixes[starts] = " ;\n    <" + predicate_iris[starts] + "> "
+        starts = subject_offsets[:-1]
+        prefixes[starts] = (
+            "<" + subject_iris[starts] + "> <" + predicate_iris[starts] + "> "
+        )
+
+        statements = prefixes + "<" + objects.to_numpy(dtype=object)[order] + ">"
+        statements[subject_offsets[1:] - 1] += " .\n\n"
+
+        return "".join(statements.tolist())
+
+    def get_node_connection_lines(
+        self, df: pd.DataFrame, base: str, context: str | None = None
+    ) -> str:
+        subjects, predicate_types, objects = self.get_node_connection_terms(df)
+
+        graph_label = f" <{context}>" if context is not None else ""
+        lines = (
+            f"<{base}"
+            + subjects
+            + f"> <{base}"
+            + predicate_types
+            + f"> <{base}"
+            + objects
+            + ">"
+            + graph_label
+            + " .\n"
+        )
+
+        return "".join(lines.tolist())
+
+    def write_rdf_file(
+        self, dir_path: str, file_name: str = "rdf", compression: str | None = None
+    ) -> None:
+        with open_output(f"{dir_path}/{file_name}.ttl", compression) as text_file:
             text_file.write(self.rdf_text)
@@ -1,2 +1,3 @@
 from .rdf_exporter import rdf_exporter
+from .ntriples_exporter import ntriples_exporter
 from .RDF import RDF
\ No newline at end of file
@@ -0,0 +1,109 @@
+import os
+import shutil
+import sys
+import uuid
+from typing import Callable
+from tqdm import tqdm
+import pandas as pd
+from loader import ChunkedCsv
+from output import get_output_path, open_output
+from parallel import WorkerPool
+from .RDF import RDF
+
+
+def write_shard(
+    df: pd.DataFrame,
+    get_lines: Callable[..., str],
+    dir_path: str,
+    compression: str | None,
+    *args,
+) -> str | None:
+    # runs on the workers, every chunk's lines are written to a temporary file of
+    # their own which is renamed to its shard's name once the shards before it are
+
+    lines = get_lines(df, *args)
+
+    if lines == "":
+        return None
+
+    file_path = f"{dir_path}/.{uuid.uuid4().hex}.tmp"
+
+    with open_output(file_path, compression) as f:
+        f.write(lines)
+
+    return get_output_path(file_path, compression)
+
+
+def ntriples_exporter(
+    graph_name: str,
+    node_dfs: dict[str, pd.DataFrame | ChunkedCsv],
+    relation_dfs: dict[str, pd.DataFrame | ChunkedCsv],
+    csvs_dir_path: str,
+    quads: bool = False,
+    pool: WorkerPool | None = None,
+    compression: str | None = None,
+):
+    # every line of N-Triples/N-Quads is a statement of its own so each chunk is
+    # written to a separate shard by the worker converting it, the shards are
+    # numbered in table and chunk order and can be loaded concurrently. With quads
+    # the graph's base iri is the context of every statement. With a compression
+    # every shard is compressed by its worker
+
+    extension = "nq" if quads else "nt"
+    dir_path = f"{csvs_dir_path}/{graph_name}_{extension}"
+    base = f"http://{graph_name}/"
+    context = base if quads else None
+
+    shutil.rmtree(dir_path, ignore_errors=True)
+    os.makedirs(dir_path)
+
+    pool = pool if pool is not None else WorkerPool()
+    rdf_graph = RDF(None)
+    shard_count = 0
+
+    for desc, dfs, get_args in [
+        (
+            "Node Counter",
+            node_dfs,
+            lambda df_name, df: (
+                rdf_graph.get_node_lines,
+                dir_path,
+                compression,
+                df.columns[0],
+                df_name,
+                base,
+                context,
+            ),
+        ),
+        (
+            "Relation Counter",
+            relation_dfs,
+            lambda *_: (
+                rdf_graph.get_node_connection_lines,
+                dir_path,
+                compression,
+                base,
+                context,
+            ),
+        ),
+    ]:
+        progress_bar = tqdm(
+            desc=desc, total=sum([len(df) for df in dfs.values()]), file=sys.stdout
+        )
+
+        for (_, row_count), shard_path in pool.map_chunks(write_shard, dfs, get_args):
+            if shard_path is not None:
+                os.replace(
+                    shard_path,
+                    get_output_path(
+                        f"{dir_path}/{graph_name}-{shard_count:05d}.{extension}",
+                        compression,
+                    ),
+                )
+                shard_count += 1
+
+            progress_bar.update(row_count)
+
+        progress_bar.close()
+
+    print(f"Written {shard_count} {extension} shards of {graph_name} to {dir_path}")
@@ -1,16 +1,37 @@
+import os
+import shutil
 import sys
 from tqdm import tqdm
 import pandas as pd
+from cache import Cache, Manifest
+from loader import ChunkedCsv, get_file_path
+from output import get_output_path, write_shard_manifest
+from parallel import WorkerPool
 from .RDF import RDF
 
 
 def rdf_exporter(
     graph_name: str,
-    node_dfs: dict[str, pd.DataFrame],
-    relation_dfs: dict[str, pd.DataFrame],
+    node_dfs: dict[str, pd.DataFrame | ChunkedCsv],
+    relation_dfs: dict[str, pd.DataFrame | ChunkedCsv],
     csvs_dir_path: str,
+    flush_size: int = 2**20,
+    pool: WorkerPool | None = None,
+    cache: Cache | None = None,
+    manifest: Manifest | None = None,
+    compression: str | None = None,
+    max_shard_size: int | None = None,
+    max_shard_rows: int | None = None,
+    group_edges: bool = False,
 ):
-    rdf_graph = RDF(graph_name)
+    # the turtle file is written while the statements are generated so only
+    # flush_size characters of it are held in memory at a time. With a manifest
+    # every csv gets its own fragment which is only regenerated when the csv changed
+    # and the turtle file is assembled from the fragments. With a max_shard_size or
+    # max_shard_rows the turtle file is split into numbered shards, listed in a json
+    # file next to them, and always written in one pass as the fragments can't be
+    # split between statements. With group_edges every subject of the relations of
+    # a chunk is written once with all of its objects
 
     node_progress_bar = tqdm(
         desc="Node Counter", total=sum([len(df) for df in node_dfs.values()]), file=sys.stdout
@@ -22,16 +43,96 @@ def rdf_exporter(
         file=sys.stdout,
     )
 
-    for df_name in node_dfs:
-        df = node_dfs[df_name]
-        rdf_graph.add_node(df, df.columns[0], df_name, node_progress_bar)
+    is_sharded = max_shard_size is not None or max_shard_rows is not None
 
-    node_progress_bar.close()
+    if manifest is None or is_sharded:
+        rdf_graph = RDF(
+            graph_name,
+            f"{csvs_dir_path}/{graph_name}.ttl",
+            flush_size,
+            cache,
+            compression,
+            max_shard_size,
+            max_shard_rows,
+            group_edges,
+        )
 
-    for df in relation_dfs.values():
-        rdf_graph.add_node_connections(df, relation_progress_bar)
+        rdf_graph.add_nodes(node_dfs, node_progress_bar, pool)
+        node_progress_bar.close()
 
-    relation_progress_bar.close()
+        rdf_graph.add_nodes_connections(relation_dfs, relation_progress_bar, pool)
+        relation_progress_bar.close()
 
-    rdf_graph.write_rdf_file(csvs_dir_path, graph_name)
-    print(f"Written {graph_name}.ttl to {csvs_dir_path}")
+        rdf_graph.close()
+
+        if is_sharded:
+            write_shard_manifest(
+                f"{csvs_dir_path}/{graph_name}_shards.json",
+                {f"{graph_name}.ttl": rdf_graph.file},
+            )
+
+            print(
+                f"Written {len(rdf_graph.file.shards)} shards of {graph_name}.ttl and "
+                f"{graph_name}_shards.json to {csvs_dir_path}"
+            )
+
+            return
+    else:
+        fragment_paths = []
+
+        for dir_name, dfs, add_tables, progress_bar in [
+            ("nodes", node_dfs, RDF.add_nodes, node_progress_bar),
+            ("edges", relation_dfs, RDF.add_nodes_connections, relation_progress_bar),
+        ]:
+            fragments_dir_path = f"{csvs_dir_path}/.csv2graph_fragments/rdf/{dir_name}"
+            os.makedirs(fragments_dir_path, exist_ok=True)
+
+            for df_name, df in dfs.items():
+                fragment_path = f"{fragments_dir_path}/{df_name}.ttl"
+                input_name = f"{dir_name}/{df_name}"
+
+                record = manifest.get_record("rdf", input_name, get_file_path(df))
+
+                # fragments written with the relations grouped the other way are
+                # regenerated too
+                if record is None or record.get("group_edges", False) != group_edges:
+                    fragment = RDF(
+                        None, fragment_path, flush_size, cache, group_edges=group_edges
+                    )
+                    add_tables(fragment, {df_name: df}, progress_bar, pool)
+                    fragment.close()
+
+                    manifest.set_record(
+                        "rdf",
+                        input_name,
+                        get_file_path(df),
+                        {"fragments": [fragment_path], "group_edges": group_edges},
+                    )
+                else:
+                    progress_bar.update(len(df))
+
+                fragment_paths.append(fragment_path)
+
+            progress_bar.close()
+
+        manifest.remove_stale(
+            "rdf",
+            {f"nodes/{df_name}" for df_name in node_dfs}
+            | {f"edges/{df_name}" for df_name in relation_dfs},
+        )
+
+        rdf_graph = RDF(
+            graph_name, f"{csvs_dir_path}/{graph_name}.ttl", compression=compression
+        )
+        rdf_graph.flush()
+
+        for fragment_path in fragment_paths:
+            with open(fragment_path) as fragment:
+                shutil.copyfileobj(fragment, rdf_graph.file, flush_size)
+
+        rdf_graph.close()
+
+    print(
+        f"Written {get_output_path(f'{graph_name}.ttl', compression)} "
+        f"to {csvs_dir_path}"
+    )
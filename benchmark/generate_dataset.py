@@ -0,0 +1,189 @@
+import argparse
+import os
+import numpy as np
+import pandas as pd
+
+# property columns cycle through these types so every field type the exporters and
+# infer_schema handle is present
+
+column_types = ["str", "int", "float", "bool", "date"]
+
+
+def get_start_indexes(
+    rng: np.random.Generator,
+    node_count: int,
+    edge_count: int,
+    degree_distribution: str,
+    exponent: float,
+) -> np.ndarray:
+    # the start node of every edge, with "zipf" a node's share of the edges falls
+    # off with its rank by the exponent so a few nodes get most of them
+
+    match degree_distribution:
+        case "uniform":
+            return rng.integers(0, node_count, edge_count)
+        case "zipf":
+            weights = np.arange(1, node_count + 1, dtype=float) ** -exponent
+            ranks = rng.choice(node_count, edge_count, p=weights / weights.sum())
+
+            return rng.permutation(node_count)[ranks]
+        case _:
+            raise ValueError(f"Unknown degree distribution {degree_distribution}")
+
+
+def get_strings(rng: np.random.Generator, count: int, string_width: int) -> np.ndarray:
+    # words of random letters separated by spaces, string_width characters long
+
+    letters = rng.integers(
+        ord("a"), ord("z") + 1, (count, string_width), dtype=np.uint8
+    )
+    letters[:, 5::6] = ord(" ")
+
+    return letters.view(f"S{string_width}").ravel().astype(str)
+
+
+def get_node_table(
+    rng: np.random.Generator,
+    table_name: str,
+    node_count: int,
+    column_count: int,
+    string_width: int,
+) -> pd.DataFrame:
+    table = {"id": pd.Series(np.arange(node_count)).map(f"{table_name}_{{}}".format)}
+
+    for i in range(column_count):
+        column_type = column_types[i % len(column_types)]
+
+        match column_type:
+            case "str":
+                values = get_strings(rng, node_count, string_width)
+            case "int":
+                values = rng.integers(0, 10**6, node_count)
+            case "float":
+                values = rng.random(node_count) * 1000
+            case "bool":
+                values = rng.random(node_count) < 0.5
+            case "date":
+                values = (
+                    np.datetime64("2000-01-01") + rng.integers(0, 10**4, node_count)
+                ).astype(str)
+
+        table[f"{column_type}_{i}"] = values
+
+    return pd.DataFrame(table)
+
+
+def generate_dataset(
+    dir_path: str,
+    table_names: list[str] = ["user", "post", "comment"],
+    node_count: int = 10_000,
+    column_count: int = 5,
+    string_width: int = 16,
+    degree: float = 5,
+    degree_distribution: str = "zipf",
+    exponent: float = 1.1,
+    seed: int = 0,
+) -> None:
+    # writes nodes/<table>.csv for every table name, edges/<first>_<table>.csv
+    # relating the first table to every other one and edges/<first>_junction.csv
+    # relating it to all of them through a collection field. Every start node has
+    # degree edges on average in each edge file
+
+    rng = np.random.default_rng(seed)
+
+    os.makedirs(f"{dir_path}/nodes", exist_ok=True)
+    os.makedirs(f"{dir_path}/edges", exist_ok=True)
+
+    for table_name in table_names:
+        get_node_table(rng, table_name, node_count, column_count, string_width).to_csv(
+            f"{dir_path}/nodes/{table_name}.csv", index=False
+        )
+
+    start_table_name, *end_table_names = table_names
+    edge_count = int(node_count * degree)
+
+    def get_ids(table_name: str, indexes: np.ndarray) -> pd.Series:
+        return pd.Series(indexes).map(f"{table_name}_{{}}".format)
+
+    for end_table_name in end_table_names:
+        pd.DataFrame(
+            {
+                f"{start_table_name}_id": get_ids(
+                    start_table_name,
+                    get_start_indexes(
+                        rng, node_count, edge_count, degree_distribution, exponent
+                    ),
+                ),
+                f"{end_table_name}_id": get_ids(
+                    end_table_name, rng.integers(0, node_count, edge_count)
+                ),
+            }
+        ).to_csv(
+            f"{dir_path}/edges/{start_table_name}_{end_table_name}.csv", index=False
+        )
+
+    if end_table_names:
+        collections = rng.choice(end_table_names, edge_count)
+        end_indexes = rng.integers(0, node_count, edge_count)
+
+        pd.DataFrame(
+            {
+                f"{start_table_name}_id": get_ids(
+                    start_table_name,
+                    get_start_indexes(
+                        rng, node_count, edge_count, degree_distribution, exponent
+                    ),
+                ),
+                "collection": collections,
+                "id": [
+                    f"{collection}_{index}"
+                    for collection, index in zip(collections, end_indexes)
+                ],
+            }
+        ).to_csv(f"{dir_path}/edges/{start_table_name}_junction.csv", index=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generate a synthetic nodes/edges dataset for csv2graph"
+    )
+
+    parser.add_argument("-p", "--dirpath", dest="dirpath", required=True)
+    parser.add_argument(
+        "-t", "--tables", dest="tables", default="user,post,comment", help="Node tables"
+    )
+    parser.add_argument(
+        "-n", "--nodes", dest="nodes", type=int, default=10_000, help="Nodes per table"
+    )
+    parser.add_argument(
+        "-c", "--columns", dest="columns", type=int, default=5, help="Property columns"
+    )
+    parser.add_argument(
+        "-sw", "--stringwidth", dest="stringwidth", type=int, default=16
+    )
+    parser.add_argument(
+        "-d", "--degree", dest="degree", type=float, default=5, help="Mean out degree"
+    )
+    parser.add_argument(
+        "-dd",
+        "--distribution",
+        dest="distribution",
+        choices=["uniform", "zipf"],
+        default="zipf",
+    )
+    parser.add_argument("-e", "--exponent", dest="exponent", type=float, default=1.1)
+    parser.add_argument("-s", "--seed", dest="seed", type=int, default=0)
+
+    args = parser.parse_args()
+
+    generate_dataset(
+        args.dirpath,
+        args.tables.split(","),
+        args.nodes,
+        args.columns,
+        args.stringwidth,
+        args.degree,
+        args.distribution,
+        args.exponent,
+        args.seed,
+    )
@@ -0,0 +1,282 @@
+import argparse
+import contextlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+exporters = ["rdf", "ntriples", "cypher", "d2rq", "sqlite", "redisgraph"]
+
+
+def get_peak_rss_mb() -> dict[str, float]:
+    # the peak rss of this process and the largest of its finished worker
+    # processes, which ru_maxrss of RUSAGE_SELF leaves out. ru_maxrss is in
+    # kilobytes on linux
+
+    return {
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "peak_children_rss_mb": (
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+        ),
+    }
+
+
+def run_exporter(
+    exporter: str,
+    dir_path: str,
+    chunksize: int | None = None,
+    workers: int = 1,
+) -> dict:
+    # runs the stages of main.py for one exporter without the cache and returns the
+    # wall time, rows per second and the peak rss of the process and its workers
+    # reached by the end of every stage
+
+    from RDF import ntriples_exporter, rdf_exporter
+    from cypher import cypher_exporter
+    from d2rq import d2rq_exporter, sqlite_exporter
+    from data_cleaner import infer_schema
+    from loader import get_table_name, read_table
+    from parallel import WorkerPool
+    from redis_graph import RedisGraph
+
+    stages = []
+    stage_start = time.perf_counter()
+
+    def end_stage(name: str, row_count: int):
+        nonlocal stage_start
+
+        seconds = time.perf_counter() - stage_start
+        stages.append(
+            {
+                "stage": name,
+                "seconds": seconds,
+                "rows_per_second": row_count / seconds if seconds > 0 else None,
+                **get_peak_rss_mb(),
+            }
+        )
+        stage_start = time.perf_counter()
+
+    node_dfs = {
+        get_table_name(file_name): read_table(
+            f"{dir_path}/nodes/{file_name}", chunksize
+        )
+        for file_name in sorted(os.listdir(f"{dir_path}/nodes"))
+        if get_table_name(file_name) is not None
+    }
+    relation_dfs = {
+        get_table_name(file_name): read_table(
+            f"{dir_path}/edges/{file_name}", chunksize
+        )
+        for file_name in sorted(os.listdir(f"{dir_path}/edges"))
+        if get_table_name(file_name) is not None
+    }
+    row_count = sum([len(df) for df in {**node_dfs, **relation_dfs}.values()])
+
+    end_stage("load", row_count)
+
+    pool = WorkerPool(workers)
+    schemas = {}
+
+    if exporter in ("d2rq", "sqlite", "redisgraph"):
+        schema_dfs = (
+            node_dfs if exporter == "redisgraph" else {**node_dfs, **relation_dfs}
+        )
+        schemas = {df_name: infer_schema(df) for df_name, df in schema_dfs.items()}
+
+        end_stage("schema", sum([len(df) for df in schema_dfs.values()]))
+
+    # the exporters report their progress on stdout, which isn't part of the result
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        match exporter:
+            case "rdf":
+                rdf_exporter("benchmark", node_dfs, relation_dfs, dir_path, pool=pool)
+            case "ntriples":
+                ntriples_exporter(
+                    "benchmark", node_dfs, relation_dfs, dir_path, pool=pool
+                )
+            case "cypher":
+                cypher_exporter(
+                    "benchmark", node_dfs, relation_dfs, dir_path, pool=pool
+                )
+            case "d2rq":
+                d2rq_exporter(
+                    "benchmark", node_dfs, relation_dfs, dir_path, pool, schemas
+                )
+            case "sqlite":
+                sqlite_exporter(
+                    "benchmark", node_dfs, relation_dfs, dir_path, pool, schemas
+                )
+            case "redisgraph":
+                RedisGraph(
+                    "benchmark", node_dfs, relation_dfs, dir_path, False, pool, schemas
+                ).write_bulk_csvs()
+
+    pool.close()
+
+    end_stage("export", row_count)
+
+    return {
+        "exporter": exporter,
+        "rows": row_count,
+        "seconds": sum([stage["seconds"] for stage in stages]),
+        "rows_per_second": row_count / sum([stage["seconds"] for stage in stages]),
+        **get_peak_rss_mb(),
+        "stages": stages,
+    }
+
+
+def run_benchmark(
+    dir_path: str,
+    exporter_names: list[str] = exporters,
+    chunksize: int | None = None,
+    workers: int = 1,
+) -> list[dict]:
+    # every exporter runs in a fresh process so their peak rss don't mask each other
+
+    results = []
+
+    for exporter in exporter_names:
+        command = [
+            sys.executable,
+            "-m",
+            "benchmark.run_benchmark",
+            "-p",
+            dir_path,
+            "-x",
+            exporter,
+            "-w",
+            str(workers),
+            "--child",
+        ]
+
+        if chunksize is not None:
+            command += ["-cs", str(chunksize)]
+
+        process = subprocess.run(
+            command,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            capture_output=True,
+            text=True,
+        )
+
+        if process.returncode != 0:
+            raise RuntimeError(f"The {exporter} benchmark failed:\n{process.stderr}")
+
+        results.append(json.loads(process.stdout.splitlines()[-1]))
+
+    return results
+
+
+def print_results(results: list[dict]) -> None:
+    print(
+        f"{'exporter':<12}{'stage':<8}{'seconds':>10}{'rows/s':>14}{'peak rss MB':>14}"
+        f"{'workers MB':>14}"
+    )
+
+    for result in results:
+        for stage in [*result["stages"], {**result, "stage": "total"}]:
+            rows_per_second = stage["rows_per_second"] or 0
+
+            print(
+                f"{result['exporter']:<12}{stage['stage']:<8}{stage['seconds']:>10.2f}"
+                f"{rows_per_second:>14,.0f}{stage['peak_rss_mb']:>14.1f}"
+                f"{stage['peak_children_rss_mb']:>14.1f}"
+            )
+
+
+def get_regressions(
+    results: list[dict], baseline: list[dict], tolerance: float
+) -> list[str]:
+    # exporters that got more than tolerance slower, or used more than tolerance more
+    # memory, than in the baseline run
+
+    baseline = {result["exporter"]: result for result in baseline}
+    regressions = []
+
+    for result in results:
+        previous = baseline.get(result["exporter"])
+
+        if previous is None:
+            continue
+
+        for metric in ["seconds", "peak_rss_mb", "peak_children_rss_mb"]:
+            # baselines from before the workers were measured don't have their rss
+            if metric not in previous:
+                continue
+
+            if result[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(
+                    f"{result['exporter']} {metric}: "
+                    f"{previous[metric]:.2f} -> {result[metric]:.2f}"
+                )
+
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure the speed and memory use of the csv2graph exporters"
+    )
+
+    parser.add_argument("-p", "--dirpath", dest="dirpath", required=True)
+    parser.add_argument(
+        "-x",
+        "--exporters",
+        dest="exporters",
+        default=",".join(exporters),
+        help="Comma separated exporters to run",
+    )
+    parser.add_argument("-cs", "--chunksize", dest="chunksize", type=int, default=None)
+    parser.add_argument("-w", "--workers", dest="workers", type=int, default=1)
+    parser.add_argument(
+        "-o", "--output", dest="output", help="Write the results to this JSON file"
+    )
+    parser.add_argument(
+        "-b",
+        "--baseline",
+        dest="baseline",
+        help="JSON results of an earlier run to compare against",
+    )
+    parser.add_argument(
+        "--tolerance",
+        dest="tolerance",
+        type=float,
+        default=0.1,
+        help="Fraction an exporter may get slower or bigger than the baseline",
+    )
+    parser.add_argument(
+        "--child", dest="child", action="store_true", help=argparse.SUPPRESS
+    )
+
+    args = parser.parse_args()
+
+    if args.child:
+        print(
+            json.dumps(
+                run_exporter(args.exporters, args.dirpath, args.chunksize, args.workers)
+            )
+        )
+        sys.exit(0)
+
+    results = run_benchmark(
+        args.dirpath, args.exporters.split(","), args.chunksize, args.workers
+    )
+
+    print_results(results)
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            regressions = get_regressions(results, json.load(f), args.tolerance)
+
+        for regression in regressions:
+            print(f"Regression in {regression}")
+
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,2 @@
+from .cache import Cache
+from .manifest import Manifest
\ No newline at end of file
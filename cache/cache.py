@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from typing import IO, Iterator
+from .fingerprint import get_fingerprint
+
+
+class Cache:
+    """
+    On disk cache of work derived from the input csvs.
+
+    Entries are keyed by what they are (e.g. "schema") and the fingerprint of the csv
+    they were derived from, which is a hash of its contents. The hash of a file is
+    only recomputed when its size or modification time changes. Once the entries
+    take up more than max_size bytes the least recently used ones are evicted.
+    Options of the run that change what the csvs are read as, like the csv engine,
+    are given as key_params and are part of every key.
+    """
+
+    def __init__(self, dir_path: str, max_size: int = 2**30, key_params: tuple = ()):
+        self.dir_path = dir_path
+        self.max_size = max_size
+        self.key_params = key_params
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(f"{dir_path}/entries", exist_ok=True)
+
+        try:
+            with open(f"{dir_path}/index.json") as f:
+                self.index = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.index = {"files": {}, "entries": {}}
+
+    def get_fingerprint(self, file_path: str) -> str:
+        return get_fingerprint(file_path, self.index["files"])
+
+    def get_key(self, kind: str, file_path: str | None, *params) -> str | None:
+        # None when there is no file to fingerprint, which can't be cached
+
+        if file_path is None:
+            return None
+
+        key = json.dumps(
+            [kind, self.get_fingerprint(file_path), *self.key_params, *params],
+            default=str,
+        )
+
+        return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+    def get_entry_path(self, key: str) -> str:
+        return f"{self.dir_path}/entries/{key}"
+
+    def has(self, key: str | None) -> bool:
+        is_hit = key in self.index["entries"] and os.path.exists(
+            self.get_entry_path(key)
+        )
+
+        if is_hit:
+            self.hits += 1
+            self.index["entries"][key]["last_used"] = time.time()
+        else:
+            self.misses += 1
+
+        return is_hit
+
+    def get(self, key: str | None) -> str | None:
+        if not self.has(key):
+            return None
+
+        with open(self.get_entry_path(key), encoding="utf-8") as f:
+            return f.read()
+
+    def read_entry(self, key: str, block_size: int = 2**20) -> Iterator[str]:
+        with open(self.get_entry_path(key), encoding="utf-8") as f:
+            while block := f.read(block_size):
+                yield block
+
+    def put(self, key: str | None, text: str):
+        if key is None:
+            return
+
+        f = self.open_entry(key)
+        f.write(text)
+        self.close_entry(key, f)
+
+    def open_entry(self, key: str) -> IO[str]:
+        # entries are written to a temporary file which close_entry moves into
+        # place, so an interrupted run never leaves a partial entry behind
+
+        return open(f"{self.get_entry_path(key)}.tmp", "w", encoding="utf-8")
+
+    def discard_entry(self, key: str, f: IO[str]):
+        # an entry that is given up on while it is written is never put in place
+
+        f.close()
+        os.remove(f"{self.get_entry_path(key)}.tmp")
+
+    def close_entry(self, key: str, f: IO[str]):
+        f.close()
+        os.replace(f"{self.get_entry_path(key)}.tmp", self.get_entry_path(key))
+
+        self.index["entries"][key] = {
+            "size": os.path.getsize(self.get_entry_path(key)),
+            "last_used": time.time(),
+        }
+
+    def evict(self):
+        entries = self.index["entries"]
+        total_size = sum(entry["size"] for entry in entries.values())
+
+        for key in sorted(entries, key=lambda key: entries[key]["last_used"]):
+            if total_size <= self.max_size:
+                break
+
+            total_size -= entries.pop(key)["size"]
+
+            if os.path.exists(self.get_entry_path(key)):
+                os.remove(self.get_entry_path(key))
+
+    def save(self):
+        self.evict()
+
+        with open(f"{self.dir_path}/index.json", "w") as f:
+            json.dump(self.index, f)
+
+    def clear(self):
+        shutil.rmtree(self.dir_path, ignore_errors=True)
+        os.makedirs(f"{self.dir_path}/entries", exist_ok=True)
+        self.index = {"files": {}, "entries": {}}
+
+    def get_stats(self) -> str:
+        size = sum(entry["size"] for entry in self.index["entries"].values())
+
+        return (
+            f"Cache: {self.hits} hits, {self.misses} misses, "
+            f"{len(self.index['entries'])} entries ({size / 2**20:.1f} MB)"
+        )
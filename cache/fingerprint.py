@@ -0,0 +1,36 @@
+import hashlib
+import os
+
+
+def get_fingerprint(file_path: str, known_files: dict[str, dict]) -> str:
+    """
+    Return a hash of the contents of a file.
+
+    :param file_path: str, the file to fingerprint
+    :param known_files: dict, size, modification time and hash of files fingerprinted
+        before by absolute path, the hash is reused while the size and modification
+        time are unchanged and the entry is updated otherwise
+    """
+    file_path = os.path.abspath(file_path)
+    stat = os.stat(file_path)
+    file = known_files.get(file_path)
+
+    if (
+        file is None
+        or file["size"] != stat.st_size
+        or file["mtime_ns"] != stat.st_mtime_ns
+    ):
+        content_hash = hashlib.blake2b(digest_size=16)
+
+        with open(file_path, "rb") as f:
+            while block := f.read(2**20):
+                content_hash.update(block)
+
+        file = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "hash": content_hash.hexdigest(),
+        }
+        known_files[file_path] = file
+
+    return file["hash"]
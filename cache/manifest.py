@@ -0,0 +1,73 @@
+import json
+import os
+from .fingerprint import get_fingerprint
+
+
+class Manifest:
+    """
+    Record of the output fragments every input csv produced in an earlier run.
+
+    Records are kept per output type (e.g. "rdf") and input (e.g. "nodes/user"), and
+    are only handed back while the input's contents and fragments are unchanged, so
+    an incremental export only has to regenerate the fragments of new or modified
+    csvs.
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+
+        try:
+            with open(file_path) as f:
+                self.manifest = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.manifest = {"files": {}, "outputs": {}}
+
+    def get_input_fingerprint(self, file_path: str | None) -> str | None:
+        if file_path is None:
+            return None
+
+        return get_fingerprint(file_path, self.manifest["files"])
+
+    def get_record(
+        self, output_type: str, input_name: str, file_path: str | None
+    ) -> dict | None:
+        record = self.manifest["outputs"].get(output_type, {}).get(input_name)
+
+        if (
+            record is None
+            or record["fingerprint"] is None
+            or record["fingerprint"] != self.get_input_fingerprint(file_path)
+            or not all(os.path.exists(path) for path in record["fragments"])
+        ):
+            return None
+
+        return record
+
+    def set_record(
+        self,
+        output_type: str,
+        input_name: str,
+        file_path: str | None,
+        record: dict,
+    ):
+        # record holds the paths of the input's fragments under "fragments"
+
+        self.manifest["outputs"].setdefault(output_type, {})[input_name] = {
+            **record,
+            "fingerprint": self.get_input_fingerprint(file_path),
+        }
+
+    def remove_stale(self, output_type: str, input_names: set[str]):
+        # drop the records and fragments of inputs that no longer exist
+
+        records = self.manifest["outputs"].get(output_type, {})
+
+        for input_name in list(records):
+            if input_name not in input_names:
+                for path in records.pop(input_name)["fragments"]:
+                    if os.path.exists(path):
+                        os.remove(path)
+
+    def save(self):
+        with open(self.file_path, "w") as f:
+            json.dump(self.manifest, f)
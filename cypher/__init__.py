@@ -0,0 +1 @@
+from .cypher_exporter import cypher_exporter
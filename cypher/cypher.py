@@ -0,0 +1,209 @@
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+from loader import ChunkedCsv
+from output import StatementWriter, open_output
+from parallel import WorkerPool
+
+
+class Cypher(StatementWriter):
+    def __init__(
+        self,
+        file_path: str,
+        batch_size: int = 1000,
+        flush_size: int = 2**20,
+        compression: str | None = None,
+    ) -> None:
+        # rows are sent to the database in batches of at most batch_size rows, each
+        # batch is set as the rows parameter of one UNWIND statement. Statements are
+        # written to the file once more than flush_size characters are buffered, with
+        # a compression the file is compressed on a background thread
+
+        super().__init__(open_output(file_path, compression), flush_size)
+        self.batch_size = batch_size
+
+    @staticmethod
+    def quote_name(name: str) -> str:
+        return "`" + str(name).replace("`", "``") + "`"
+
+    @staticmethod
+    def get_value_column(values: pd.Series) -> pd.Series:
+        # cypher literals of a column, missing and non finite values become null
+
+        if pd.api.types.is_bool_dtype(values):
+            return values.map({True: "true", False: "false"})
+
+        if pd.api.types.is_integer_dtype(values):
+            return values.astype(str)
+
+        if pd.api.types.is_float_dtype(values):
+            literals = values.astype(str)
+            literals[~np.isfinite(values)] = "null"
+
+            return literals
+
+        return Cypher.get_string_column(values)
+
+    @staticmethod
+    def get_string_column(values: pd.Series) -> pd.Series:
+        # single quoted string literals, escaped so every literal stays on one line
+
+        literals = pd.Series("null", index=values.index, dtype=object)
+        is_present = values.notna()
+
+        literals[is_present] = (
+            "'"
+            + values[is_present]
+            .astype(str)
+            .str.replace("\\", "\\\\", regex=False)
+            .str.replace("'", "\\'", regex=False)
+            .str.replace("\n", "\\n", regex=False)
+            .str.replace("\r", "\\r", regex=False)
+            .str.replace("\t", "\\t", regex=False)
+            + "'"
+        )
+
+        return literals
+
+    def get_map_column(self, columns: dict[str, pd.Series]) -> pd.Series:
+        # a cypher map literal per row with the given keys and literal columns
+
+        maps = None
+
+        for key, literals in columns.items():
+            entry = f"{self.quote_name(key)}: " + literals
+            maps = "{" + entry if maps is None else maps + ", " + entry
+
+        return maps + "}"
+
+    def get_batch_statements(self, maps: pd.Series, statement: str) -> str:
+        # the rows are set with the map form of :param, the arrow form is deprecated
+
+        maps = maps.tolist()
+
+        return "".join(
+            ":param {rows: ["
+            + ", ".join(maps[start : start + self.batch_size])
+            + "]}\n"
+            + statement
+            + "\n\n"
+            for start in range(0, len(maps), self.batch_size)
+        )
+
+    def add_constraints(self, node_dfs: dict[str, pd.DataFrame | ChunkedCsv]) -> None:
+        # every node label gets a uniqueness constraint (and with it an index) on its
+        # id field, created before any data so merging and matching nodes is cheap
+
+        for df_name, df in node_dfs.items():
+            self.add_text(
+                f"CREATE CONSTRAINT IF NOT EXISTS FOR (n:{self.quote_name(df_name)}) "
+                f"REQUIRE n.{self.quote_name(df.columns[0])} IS UNIQUE;\n"
+            )
+
+        self.add_text("CALL db.awaitIndexes();\n\n")
+
+    def add_nodes(
+        self,
+        node_dfs: dict[str, pd.DataFrame | ChunkedCsv],
+        progress_bar: tqdm,
+        pool: WorkerPool | None = None,
+    ) -> None:
+        # the first column of every node table is its id and the table name its label
+
+        self.add_tables(
+            self.get_node_statements,
+            node_dfs,
+            lambda df_name, df: (df.columns[0], df_name),
+            progress_bar,
+            pool,
+        )
+
+    def get_node_statements(
+        self, df: pd.DataFrame, id_field_name: str, label: str
+    ) -> str:
+        # ids are written as strings so they match the ids of the relation tables
+        # whatever type each table's id column was read as, rows without an id can't
+        # be merged and are skipped
+
+        df = df.loc[df[id_field_name].notna()]
+
+        columns = {
+            field_name: (
+                self.get_string_column(df[field_name].astype(str))
+                if field_name == id_field_name
+                else self.get_value_column(df[field_name])
+            )
+            for field_name in df.columns
+        }
+        id_field_name = self.quote_name(id_field_name)
+        statement = (
+            "UNWIND $rows AS row\n"
+            f"MERGE (n:{self.quote_name(label)} {{{id_field_name}: row.{id_field_name}}})\n"
+            "SET n += row;"
+        )
+
+        return self.get_batch_statements(self.get_map_column(columns), statement)
+
+    def add_nodes_connections(
+        self,
+        relation_dfs: dict[str, pd.DataFrame | ChunkedCsv],
+        node_dfs: dict[str, pd.DataFrame | ChunkedCsv],
+        progress_bar: tqdm,
+        pool: WorkerPool | None = None,
+    ) -> None:
+        # relations match their nodes on the id field of the node table of the label
+
+        node_id_field_names = {
+            df_name: df.columns[0] for df_name, df in node_dfs.items()
+        }
+
+        self.add_tables(
+            self.get_node_connection_statements,
+            relation_dfs,
+            lambda *_: (node_id_field_names,),
+            progress_bar,
+            pool,
+        )
+
+    def get_node_connection_statements(
+        self, df: pd.DataFrame, node_id_field_names: dict[str, str]
+    ) -> str:
+        # like RDF.get_node_connection_statements the first column holds the ids of
+        # the start nodes, the relation is named after the end nodes' label which is
+        # the second column's name or, with a collection field, the collection
+
+        hasCollectionField = len(df.columns) == 3
+
+        start_label = df.columns[0].replace("_id", "")
+
+        end_field_name = "id" if hasCollectionField else df.columns[1]
+        df = df.loc[df[df.columns[0]].notna() & df[end_field_name].notna()]
+
+        # the rows of every collection in order of first appearance, split in one
+        # groupby pass
+        if hasCollectionField:
+            groups = df.groupby("collection", sort=False)
+        else:
+            groups = [(df.columns[1].replace("_id", "").lower(), df)]
+
+        statements = ""
+
+        for end_label, rows in groups:
+            maps = self.get_map_column(
+                {
+                    "start": self.get_string_column(rows[df.columns[0]].astype(str)),
+                    "end": self.get_string_column(rows[end_field_name].astype(str)),
+                }
+            )
+            start_id = self.quote_name(node_id_field_names.get(start_label, "id"))
+            end_id = self.quote_name(node_id_field_names.get(end_label, "id"))
+            statement = (
+                "UNWIND $rows AS row\n"
+                f"MATCH (a:{self.quote_name(start_label)} {{{start_id}: row.start}})\n"
+                f"MATCH (b:{self.quote_name(end_label)} {{{end_id}: row.end}})\n"
+                f"MERGE (a)-[:{self.quote_name(end_label)}]->(b);"
+            )
+
+            statements += self.get_batch_statements(maps, statement)
+
+        return statements
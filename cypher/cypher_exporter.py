@@ -0,0 +1,52 @@
+import sys
+from tqdm import tqdm
+import pandas as pd
+from loader import ChunkedCsv
+from output import get_output_path
+from parallel import WorkerPool
+from .cypher import Cypher
+
+
+def cypher_exporter(
+    graph_name: str,
+    node_dfs: dict[str, pd.DataFrame | ChunkedCsv],
+    relation_dfs: dict[str, pd.DataFrame | ChunkedCsv],
+    csvs_dir_path: str,
+    batch_size: int = 1000,
+    flush_size: int = 2**20,
+    pool: WorkerPool | None = None,
+    compression: str | None = None,
+):
+    # the script creates the id constraints, then merges the nodes of every label
+    # and the relations between them in UNWIND batches of batch_size rows, it is
+    # written while the statements are generated and can be run with cypher-shell
+
+    cypher = Cypher(
+        f"{csvs_dir_path}/{graph_name}.cypher", batch_size, flush_size, compression
+    )
+
+    cypher.add_constraints(node_dfs)
+
+    node_progress_bar = tqdm(
+        desc="Node Counter",
+        total=sum([len(df) for df in node_dfs.values()]),
+        file=sys.stdout,
+    )
+
+    cypher.add_nodes(node_dfs, node_progress_bar, pool)
+    node_progress_bar.close()
+
+    relation_progress_bar = tqdm(
+        desc="Relation Counter",
+        total=sum([len(df) for df in relation_dfs.values()]),
+        file=sys.stdout,
+    )
+
+    cypher.add_nodes_connections(relation_dfs, node_dfs, relation_progress_bar, pool)
+    relation_progress_bar.close()
+
+    cypher.close()
+    print(
+        f"Written {get_output_path(f'{graph_name}.cypher', compression)} "
+        f"to {csvs_dir_path}"
+    )
@@ -1 +1,2 @@
-from .d2rq_exporter import d2rq_exporter
\ No newline at end of file
+from .d2rq_exporter import d2rq_exporter
+from .sqlite_exporter import sqlite_exporter
@@ -1,4 +1,6 @@
 from typing import Literal
+import numpy as np
+import pandas as pd
 
 pandas_type_literal = Literal[
     "int64" "float64" "bool" "datetime64" "timedelta[ns]" "category", "object"
@@ -36,6 +38,115 @@ class Field:
     def is_foreign_key(self):
         return self.constraint == "FK"
 
+    def get_numbers(self, values: pd.Series) -> pd.Series:
+        # the values as numbers, present values that aren't numbers are an error
+        # rather than becoming NULL
+
+        numbers = pd.to_numeric(values, errors="coerce")
+        is_invalid = numbers.isna() & values.notna()
+
+        if is_invalid.any():
+            raise ValueError(
+                f"{values[is_invalid].iloc[0]!r} of field {self.name} isn't a valid "
+                f"{self.type} value"
+            )
+
+        return numbers
+
+    def get_text_values(self, values: pd.Series) -> tuple[pd.Series, bool]:
+        # the text of every value as this field's type, NaN for missing values, and
+        # whether the values are strings which need quoting/escaping. Missing values
+        # are found first as astype(str) can overwrite the NaN of unpickled object
+        # columns (i.e. chunks sent to a worker) in place
+
+        is_present = values.notna()
+
+        match self.type:
+            case "INTEGER" | "FLOAT":
+                numbers = self.get_numbers(values)
+                text = numbers.astype(str).where(np.isfinite(numbers))
+
+                if self.type == "INTEGER" and numbers.dtype.kind == "f":
+                    # integers read as floats because of missing values lose the .0
+
+                    is_integer = np.isfinite(numbers) & (numbers == np.floor(numbers))
+                    text[is_integer] = numbers[is_integer].astype("int64").astype(str)
+
+                return text, False
+            case "BOOLEAN":
+                return (
+                    values.astype(str)
+                    .str.lower()
+                    .map({"true": "1", "false": "0", "1": "1", "0": "0"})
+                    .where(is_present)
+                ), False
+            case _:
+                return values.astype(str).where(is_present), True
+
+    def get_sql_values(self, values: pd.Series) -> pd.Series:
+        # literals for an INSERT statement
+
+        text, is_string = self.get_text_values(values)
+
+        if is_string:
+            text = (
+                "'"
+                + text.str.replace("\\", "\\\\", regex=False)
+                .str.replace("'", "\\'", regex=False)
+                .str.replace("\n", "\\n", regex=False)
+                .str.replace("\r", "\\r", regex=False)
+                .str.replace("\0", "\\0", regex=False)
+                .str.replace("\x1a", "\\Z", regex=False)
+                + "'"
+            )
+
+        return text.fillna("NULL")
+
+    def get_tsv_values(self, values: pd.Series) -> pd.Series:
+        # fields for LOAD DATA with its default tab separated, backslash escaped format
+
+        text, is_string = self.get_text_values(values)
+
+        if is_string:
+            text = (
+                text.str.replace("\\", "\\\\", regex=False)
+                .str.replace("\t", "\\t", regex=False)
+                .str.replace("\n", "\\n", regex=False)
+                .str.replace("\r", "\\r", regex=False)
+                .str.replace("\0", "\\0", regex=False)
+            )
+
+        return text.fillna("\\N")
+
+    def get_python_values(self, values: pd.Series) -> list:
+        # values as the python objects sqlite3 stores, None for missing values
+
+        match self.type:
+            case "INTEGER" | "FLOAT":
+                numbers = self.get_numbers(values)
+                python_values = numbers.astype(object).where(np.isfinite(numbers), None)
+
+                if self.type == "INTEGER" and numbers.dtype.kind == "f":
+                    is_integer = np.isfinite(numbers) & (numbers == np.floor(numbers))
+                    python_values[is_integer] = (
+                        numbers[is_integer].astype("int64").astype(object)
+                    )
+
+                return python_values.tolist()
+            case "BOOLEAN":
+                text, _ = self.get_text_values(values)
+
+                return [int(val) if isinstance(val, str) else None for val in text]
+            case _:
+                text, _ = self.get_text_values(values)
+
+                return text.astype(object).where(text.notna(), None).tolist()
+
+    def get_sqlite_declaration(self) -> str:
+        type = self.type if self.type != "unknown" else "TEXT"
+
+        return f'"{self.name}" {type}'
+
     def __str__(self):
         type = self.type
 
@@ -66,6 +177,58 @@ class Table:
     ):
         self.fields.append(Field(name, type, constraint))
 
+    def get_insert_statements(self, df: pd.DataFrame, batch_size: int = 1000) -> str:
+        # multi row INSERT statements of at most batch_size rows, the columns of df are
+        # the values of the table's fields in order
+
+        rows = None
+
+        for field, field_name in zip(self.fields, df.columns):
+            values = field.get_sql_values(df[field_name])
+            rows = "(" + values if rows is None else rows + ", " + values
+
+        rows = (rows + ")").tolist()
+        insert = (
+            f"INSERT INTO {self.table_name} "
+            f"({', '.join([field.name for field in self.fields])}) VALUES\n"
+        )
+
+        return "".join(
+            insert + ",\n".join(rows[start : start + batch_size]) + ";\n"
+            for start in range(0, len(rows), batch_size)
+        )
+
+    def get_tsv_lines(self, df: pd.DataFrame) -> str:
+        lines = None
+
+        for field, field_name in zip(self.fields, df.columns):
+            values = field.get_tsv_values(df[field_name])
+            lines = values if lines is None else lines + "\t" + values
+
+        return "".join((lines + "\n").tolist())
+
+    def get_load_data_statement(self, file_path: str) -> str:
+        return (
+            f"LOAD DATA LOCAL INFILE '{file_path}' INTO TABLE {self.table_name} "
+            f"({', '.join([field.name for field in self.fields])});\n"
+        )
+
+    def get_rows(self, df: pd.DataFrame) -> list[tuple]:
+        return list(
+            zip(
+                *[
+                    field.get_python_values(df[field_name])
+                    for field, field_name in zip(self.fields, df.columns)
+                ]
+            )
+        )
+
+    def get_sqlite_insert_statement(self) -> str:
+        field_names = ", ".join([f'"{field.name}"' for field in self.fields])
+        parameters = ", ".join(["?"] * len(self.fields))
+
+        return f'INSERT INTO "{self.table_name}" ({field_names}) VALUES ({parameters})'
+
     def __str__(self):
         create_table_query = f"CREATE TABLE {self.table_name} (\n"
         constraints = []
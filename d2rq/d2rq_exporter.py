@@ -1,52 +1,195 @@
+import json
+import os
+import shutil
+from typing import Iterator
 import pandas as pd
+from cache import Cache
+from data_cleaner import TableSchema, infer_schema
+from loader import ChunkedCsv, get_file_path, unique_values
+from output import open_output
+from parallel import WorkerPool
 from .d2rq import Table
 
 
-def d2rq_exporter(
-    graph_name: str,
-    node_dfs: dict[str, pd.DataFrame],
-    relation_dfs: dict[str, pd.DataFrame],
-    csvs_dir_path: str,
-):
+def get_table_groups(
+    df: pd.DataFrame, tables: dict[str | None, Table]
+) -> Iterator[tuple[str | None, pd.DataFrame]]:
+    # the rows of a chunk per table, junction tables have a table per collection
+    # value and are split in one groupby pass, other tables are keyed by None
+
+    if None in tables:
+        yield None, df
+        return
+
+    [col_1, _, col_2] = df.columns
+
+    for collection, group in df[[col_1, col_2]].groupby(df["collection"], sort=False):
+        if collection in tables:
+            yield collection, group
+
+
+def get_tables(
+    node_dfs: dict[str, pd.DataFrame | ChunkedCsv],
+    relation_dfs: dict[str, pd.DataFrame | ChunkedCsv],
+    pool: WorkerPool | None = None,
+    schemas: dict[str, TableSchema] | None = None,
+    cache: Cache | None = None,
+) -> tuple[
+    list[Table],
+    dict[str, dict[str | None, Table]],
+    dict[str, pd.DataFrame | ChunkedCsv],
+]:
+    # the tables of the relational schema, plus the tables the rows of every csv
+    # go to (see get_table_groups) and the csvs, keyed by "nodes/<name>" and
+    # "edges/<name>". A junction csv is a single table with the key of its start
+    # entity and a key field per collection, the rows of a collection go to a table
+    # of the same name with just its two fields
+
     tables = []
-    insert_queries = []
+    data_tables: dict[str, dict[str | None, Table]] = {}
+    schemas = schemas if schemas is not None else {}
+
+    def get_field_types(df_name: str, df: pd.DataFrame | ChunkedCsv) -> dict[str, str]:
+        if df_name not in schemas:
+            schemas[df_name] = infer_schema(df)
+
+        return schemas[df_name].field_types
+
+    # distinct collection values of the junction tables, gathered chunk by chunk on
+    # the pool and merged in order of first appearance unless they are cached
+
+    pool = pool if pool is not None else WorkerPool()
+    junction_dfs = {
+        df_name: df for df_name, df in relation_dfs.items() if len(df.columns) == 3
+    }
+    collection_values = {df_name: {} for df_name in junction_dfs}
+    cache_keys = {}
+    cached_df_names = set()
+
+    if cache is not None:
+        for df_name, df in junction_dfs.items():
+            cache_keys[df_name] = cache.get_key("collection_values", get_file_path(df))
+            values = cache.get(cache_keys[df_name])
+
+            if values is not None:
+                collection_values[df_name] = dict.fromkeys(json.loads(values))
+                cached_df_names.add(df_name)
+
+    for (df_name, _), values in pool.map_chunks(
+        unique_values, junction_dfs, lambda *_: ("collection",), cached_df_names
+    ):
+        for val in values if values is not None else []:
+            collection_values[df_name].setdefault(val, None)
+
+    for df_name, key in cache_keys.items():
+        if df_name not in cached_df_names:
+            cache.put(key, json.dumps(list(collection_values[df_name]), default=str))
 
     for df_name, df in node_dfs.items():
         table = Table(df_name)
 
-        for field_name, field_type in dict(df.dtypes).items():
+        for field_name, field_type in get_field_types(df_name, df).items():
             constraint = "PK" if field_name == "id" or "_id" in field_name else None
-            table.add_field(field_name, str(field_type), constraint)
+            table.add_field(field_name, field_type, constraint)
 
         tables.append(table)
+        data_tables.setdefault(f"nodes/{df_name}", {})[None] = table
 
     for df_name, df in relation_dfs.items():
         if len(df.columns) == 2:
             table = Table(df_name.lower())
 
             [fk_name_1, fk_name_2] = list(df.columns)
-            types = dict(df.dtypes)
+            types = get_field_types(df_name, df)
 
-            table.add_field(fk_name_1, str(types[fk_name_1]), "FK")
-            table.add_field(fk_name_2, str(types[fk_name_2]), "FK")
+            table.add_field(fk_name_1, types[fk_name_1], "FK")
+            table.add_field(fk_name_2, types[fk_name_2], "FK")
 
             tables.append(table)
+            data_tables.setdefault(f"edges/{df_name}", {})[None] = table
 
             continue
 
         if len(df.columns) == 3:
             fk_name_1 = df_name.replace("_junction", "").lower()
-            fk_names = list(set(df["collection"].values.tolist()))
-            types = dict(df.dtypes)
+            fk_names = list(collection_values[df_name])
+            types = get_field_types(df_name, df)
+
+            [col_1, _, col_2] = df.columns
+            junction_table = Table(df_name.lower())
+
+            junction_table.add_field(fk_name_1, types[col_1], "FK")
 
             for fk_name_2 in fk_names:
-                [col_1, _, col_2] = df.columns
                 table = Table(df_name.lower())
 
-                table.add_field(fk_name_1, str(types[col_1]), "FK")
-                table.add_field(fk_name_2, str(types[col_2]), "FK")
+                table.add_field(fk_name_1, types[col_1], "FK")
+                table.add_field(fk_name_2, types[col_2], "FK")
+                junction_table.add_field(fk_name_2, types[col_2], "FK")
+
+                data_tables.setdefault(f"edges/{df_name}", {})[fk_name_2] = table
+
+            tables.append(junction_table)
+
+    data_dfs = {
+        f"{dir_name}/{df_name}": df
+        for dir_name, dfs in [("nodes", node_dfs), ("edges", relation_dfs)]
+        for df_name, df in dfs.items()
+        if f"{dir_name}/{df_name}" in data_tables
+    }
+
+    return tables, data_tables, data_dfs
+
 
-                tables.append(table)
+def get_data_texts(
+    df: pd.DataFrame,
+    tables: dict[str | None, Table],
+    load_mode: str,
+    batch_size: int,
+) -> list[tuple[str | None, str]]:
+    # runs on the workers, the INSERT statements or LOAD DATA lines of a chunk per
+    # table
+
+    texts = []
+
+    for collection, group in get_table_groups(df, tables):
+        if load_mode == "insert":
+            texts.append(
+                (
+                    collection,
+                    tables[collection].get_insert_statements(group, batch_size),
+                )
+            )
+        else:
+            texts.append((collection, tables[collection].get_tsv_lines(group)))
+
+    return texts
+
+
+def d2rq_exporter(
+    graph_name: str,
+    node_dfs: dict[str, pd.DataFrame | ChunkedCsv],
+    relation_dfs: dict[str, pd.DataFrame | ChunkedCsv],
+    csvs_dir_path: str,
+    pool: WorkerPool | None = None,
+    schemas: dict[str, TableSchema] | None = None,
+    cache: Cache | None = None,
+    load_mode: str = "insert",
+    batch_size: int = 1000,
+    compression: str | None = None,
+):
+    # after the tables are created the rows of every csv are loaded into them, with
+    # load_mode "insert" through multi row INSERT statements of batch_size rows,
+    # with "infile" through LOAD DATA statements reading tab separated files written
+    # to <graph_name>_sql_data and with "none" not at all. The data is generated
+    # chunk by chunk on the pool and streamed to the files. With a compression the
+    # sql script is compressed on a background thread, the LOAD DATA files are left
+    # uncompressed as MySQL can't read compressed files
+
+    pool = pool if pool is not None else WorkerPool()
+    tables, data_tables, data_dfs = get_tables(
+        node_dfs, relation_dfs, pool, schemas, cache
+    )
 
     sql_script = (
         f"CREATE DATABASE {graph_name.lower()}_db;\n\nUSE {graph_name.lower()}_db;\n\n"
@@ -54,5 +197,74 @@ def d2rq_exporter(
 
     sql_script += "\n\n".join([str(table) for table in tables])
 
-    with open(f"{csvs_dir_path}/{graph_name}.sql", "w") as f:
+    with open_output(f"{csvs_dir_path}/{graph_name}.sql", compression) as f:
         f.write(sql_script)
+
+        if load_mode == "none":
+            return
+
+        # keys and checks are switched off while loading and the load is committed
+        # at once
+
+        table_names = list(dict.fromkeys([table.table_name for table in tables]))
+
+        f.write(
+            "\n\nSET autocommit = 0;\nSET unique_checks = 0;\nSET foreign_key_checks = 0;\n"
+        )
+        f.write(
+            "".join(
+                [
+                    f"ALTER TABLE {table_name} DISABLE KEYS;\n"
+                    for table_name in table_names
+                ]
+            )
+        )
+        f.write("\n")
+
+        data_dir_path = os.path.abspath(f"{csvs_dir_path}/{graph_name}_sql_data")
+        data_file_paths = {}
+
+        if load_mode == "infile":
+            shutil.rmtree(data_dir_path, ignore_errors=True)
+            os.makedirs(data_dir_path)
+
+        results = pool.map_chunks(
+            get_data_texts,
+            data_dfs,
+            lambda df_name, _: (data_tables[df_name], load_mode, batch_size),
+        )
+
+        for (df_name, _), texts in results:
+            for collection, text in texts:
+                if load_mode == "insert":
+                    f.write(text)
+                    continue
+
+                table = data_tables[df_name][collection]
+                file_name = (
+                    table.table_name
+                    if collection is None
+                    else f"{table.table_name}_{collection}"
+                )
+                file_path = f"{data_dir_path}/{file_name}.tsv"
+
+                with open(file_path, "a", encoding="utf-8", newline="") as data_file:
+                    data_file.write(text)
+
+                data_file_paths[file_path] = table
+
+        for file_path, table in data_file_paths.items():
+            f.write(table.get_load_data_statement(file_path))
+
+        f.write("\n")
+        f.write(
+            "".join(
+                [
+                    f"ALTER TABLE {table_name} ENABLE KEYS;\n"
+                    for table_name in table_names
+                ]
+            )
+        )
+        f.write(
+            "SET foreign_key_checks = 1;\nSET unique_checks = 1;\nCOMMIT;\nSET autocommit = 1;\n"
+        )
@@ -0,0 +1,118 @@
+import os
+import sqlite3
+import sys
+import time
+import pandas as pd
+from tqdm import tqdm
+from cache import Cache
+from data_cleaner import TableSchema
+from loader import ChunkedCsv
+from parallel import WorkerPool
+from .d2rq import Table
+from .d2rq_exporter import get_table_groups, get_tables
+
+
+def get_data_rows(
+    df: pd.DataFrame, tables: dict[str | None, Table]
+) -> list[tuple[str | None, list[tuple]]]:
+    # runs on the workers, the rows of a chunk per table as sqlite3 parameters
+
+    return [
+        (collection, tables[collection].get_rows(group))
+        for collection, group in get_table_groups(df, tables)
+    ]
+
+
+def sqlite_exporter(
+    graph_name: str,
+    node_dfs: dict[str, pd.DataFrame | ChunkedCsv],
+    relation_dfs: dict[str, pd.DataFrame | ChunkedCsv],
+    csvs_dir_path: str,
+    pool: WorkerPool | None = None,
+    schemas: dict[str, TableSchema] | None = None,
+    cache: Cache | None = None,
+    transaction_size: int = 500_000,
+):
+    # materializes the d2rq tables in <graph_name>.sqlite, the rows are converted
+    # chunk by chunk on the pool and inserted with executemany in transactions of
+    # about transaction_size rows while journaling and syncing are off. The indexes
+    # on the key fields are created after the load
+
+    pool = pool if pool is not None else WorkerPool()
+    tables, data_tables, data_dfs = get_tables(
+        node_dfs, relation_dfs, pool, schemas, cache
+    )
+
+    file_path = f"{csvs_dir_path}/{graph_name}.sqlite"
+
+    if os.path.exists(file_path):
+        os.remove(file_path)
+
+    connection = sqlite3.connect(file_path, isolation_level=None)
+
+    for pragma in [
+        "journal_mode = OFF",
+        "synchronous = OFF",
+        "temp_store = MEMORY",
+        "cache_size = -262144",
+        "locking_mode = EXCLUSIVE",
+    ]:
+        connection.execute(f"PRAGMA {pragma}")
+
+    for table in tables:
+        connection.execute(
+            f'CREATE TABLE "{table.table_name}" ('
+            + ", ".join([field.get_sqlite_declaration() for field in table.fields])
+            + ")"
+        )
+
+    progress_bar = tqdm(
+        desc="Row Counter",
+        total=sum([len(df) for df in data_dfs.values()]),
+        file=sys.stdout,
+    )
+    start = time.perf_counter()
+    row_count = 0
+    transaction_row_count = 0
+
+    connection.execute("BEGIN")
+
+    for (df_name, chunk_row_count), results in pool.map_chunks(
+        get_data_rows, data_dfs, lambda df_name, _: (data_tables[df_name],)
+    ):
+        for collection, rows in results:
+            connection.executemany(
+                data_tables[df_name][collection].get_sqlite_insert_statement(), rows
+            )
+            row_count += len(rows)
+            transaction_row_count += len(rows)
+
+        if transaction_row_count >= transaction_size:
+            connection.execute("COMMIT")
+            connection.execute("BEGIN")
+            transaction_row_count = 0
+
+        progress_bar.update(chunk_row_count)
+
+    connection.execute("COMMIT")
+    progress_bar.close()
+
+    load_seconds = time.perf_counter() - start
+
+    for table in tables:
+        for field in table.fields:
+            if field.is_primary_key() or field.is_foreign_key():
+                connection.execute(
+                    f'CREATE INDEX "index_{table.table_name}_{field.name}" '
+                    f'ON "{table.table_name}" ("{field.name}")'
+                )
+
+    connection.close()
+
+    seconds = time.perf_counter() - start
+
+    print(
+        f"Loaded {row_count} rows into {graph_name}.sqlite in {seconds:.2f}s "
+        f"({row_count / load_seconds if load_seconds > 0 else 0:,.0f} rows/s, "
+        f"{seconds - load_seconds:.2f}s of which creating indexes)"
+    )
@@ -1 +1,2 @@
-from .get_pd_object_type import get_pd_object_type
\ No newline at end of file
+from .get_pd_object_type import get_pd_object_type
+from .table_schema import TableSchema, infer_schema
\ No newline at end of file
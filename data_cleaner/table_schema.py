@@ -0,0 +1,219 @@
+import json
+import pandas as pd
+from cache import Cache
+from loader import ChunkedCsv, get_file_path, is_columnar, iter_chunks, select_columns
+
+redis_types = {
+    "int64": "integer",
+    "bool": "bool",
+    "datetime64": "string",
+    "timedelta[ns]": "string",
+    "category": "string",
+    "float64": "double",
+    "object": "string",
+}
+
+mysql_types = {
+    "int64": "INTEGER",
+    "bool": "BOOLEAN",
+    "datetime64": "DATETIME",
+    "timedelta[ns]": "DATETIME",
+    "category": "LONGTEXT",
+    "float64": "FLOAT",
+    "object": "LONGTEXT",
+}
+
+
+class TableSchema:
+    """
+    Inferred type of every field of a table.
+
+    Field types use the pandas dtype names that d2rq.Field understands, with object
+    fields narrowed to int64, float64 or datetime64 when all of their values can be
+    read as such.
+    """
+
+    def __init__(self, field_types: dict[str, str]):
+        self.field_types = field_types
+
+    def to_dict(self) -> dict:
+        return {"field_types": self.field_types}
+
+    @classmethod
+    def from_dict(cls, schema: dict) -> "TableSchema":
+        return cls(schema["field_types"])
+
+    def get_redis_type(self, field_name: str) -> str:
+        return redis_types[self.field_types[field_name]]
+
+    def get_mysql_type(self, field_name: str) -> str:
+        return mysql_types[self.field_types[field_name]]
+
+
+def get_dtype_name(dtype) -> str:
+    if pd.api.types.is_bool_dtype(dtype):
+        return "bool"
+    if pd.api.types.is_integer_dtype(dtype):
+        return "int64"
+    if pd.api.types.is_float_dtype(dtype):
+        return "float64"
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return "datetime64"
+    if pd.api.types.is_timedelta64_dtype(dtype):
+        return "timedelta[ns]"
+    if isinstance(dtype, pd.CategoricalDtype):
+        return "category"
+
+    return "object"
+
+
+def is_integer(strings: pd.Series) -> bool:
+    return strings.str.fullmatch(r"[+-]?\d+").all()
+
+
+def is_float(strings: pd.Series) -> bool:
+    return pd.to_numeric(strings, errors="coerce").notna().all()
+
+
+def is_date(strings: pd.Series) -> bool:
+    return (strings.str.len() == 10).all() and (
+        pd.to_datetime(strings, errors="coerce", format="mixed").notna().all()
+    )
+
+
+def narrow_object_types(values: pd.Series, field_types: set[str]) -> set[str]:
+    # the types in field_types that every value in values can be read as, checked
+    # in order of preference with a quick look at the first values before all of
+    # them so that string fields are ruled out early
+
+    strings = values.dropna().astype(str)
+
+    for field_type, is_field_type, implied_types in [
+        ("int64", is_integer, {"int64", "float64"}),
+        ("float64", is_float, {"float64"}),
+        ("datetime64", is_date, {"datetime64"}),
+    ]:
+        if (
+            field_type in field_types
+            and is_field_type(strings.head(1000))
+            and is_field_type(strings)
+        ):
+            return field_types & implied_types
+
+    return set()
+
+
+def narrow_chunk_types(
+    chunk: pd.DataFrame,
+    object_field_types: dict[str, set[str]],
+    value_counts: dict[str, int],
+):
+    # narrows the types every object field of the chunk can still be read as and
+    # counts their values
+
+    for field_name, types in object_field_types.items():
+        values = chunk[field_name].dropna()
+
+        if len(values) == 0:
+            continue
+
+        if len(types) > 0:
+            object_field_types[field_name] = narrow_object_types(values, types)
+
+        value_counts[field_name] += len(values)
+
+
+def infer_schema(
+    df: pd.DataFrame | ChunkedCsv,
+    sample_size: int | None = None,
+    cache: Cache | None = None,
+) -> TableSchema:
+    """
+    Infer the schema of a table from its dtypes and the values of its object fields.
+    The object fields of tables read from columnar files are strings in the file's
+    schema.
+
+    :param df: DataFrame or ChunkedCsv, the table
+    :param sample_size: int, narrow the types of object fields from the first
+        sample_size rows and stop reading as soon as every object field is known to
+        be a string. Fields narrowed to a type are checked against the rest of the
+        rows, reading only those fields, so a value that doesn't fit widens the type
+        instead of being lost
+    :param cache: Cache, reuses the schema inferred for the table's csv in an earlier
+        run while the csv is unchanged
+    """
+    if cache is not None:
+        # schemas of sampled rows that weren't checked against the rest of the
+        # rows aren't reused
+        key = cache.get_key("schema", get_file_path(df), sample_size, "checked")
+        schema = cache.get(key)
+
+        if schema is not None:
+            return TableSchema.from_dict(json.loads(schema))
+
+        schema = infer_schema(df, sample_size)
+        cache.put(key, json.dumps(schema.to_dict()))
+
+        return schema
+
+    field_types = {}
+    object_field_types = {}
+    value_counts = {}
+    narrowed_types = set() if is_columnar(df) else {"int64", "float64", "datetime64"}
+
+    for field_name, dtype in dict(df.dtypes).items():
+        field_types[field_name] = get_dtype_name(dtype)
+
+        if field_types[field_name] == "object":
+            object_field_types[field_name] = set(narrowed_types)
+            value_counts[field_name] = 0
+
+    rows_checked = 0
+
+    if any(len(types) > 0 for types in object_field_types.values()):
+        for chunk in iter_chunks(select_columns(df, list(object_field_types))):
+            if sample_size is not None:
+                chunk = chunk.head(sample_size - rows_checked)
+
+            narrow_chunk_types(chunk, object_field_types, value_counts)
+            rows_checked += len(chunk)
+
+            if sample_size is not None and (
+                rows_checked >= sample_size
+                or all(len(types) == 0 for types in object_field_types.values())
+            ):
+                break
+
+    narrowed_field_types = {
+        field_name: types
+        for field_name, types in object_field_types.items()
+        if len(types) > 0 and value_counts[field_name] > 0
+    }
+
+    if rows_checked < len(df) and len(narrowed_field_types) > 0:
+        offset = 0
+
+        for chunk in iter_chunks(select_columns(df, list(narrowed_field_types))):
+            offset += len(chunk)
+
+            if offset <= rows_checked:
+                continue
+
+            narrow_chunk_types(
+                chunk.iloc[max(rows_checked - offset + len(chunk), 0) :],
+                narrowed_field_types,
+                dict.fromkeys(narrowed_field_types, 0),
+            )
+
+            if all(len(types) == 0 for types in narrowed_field_types.values()):
+                break
+
+        object_field_types.update(narrowed_field_types)
+
+    for field_name, types in object_field_types.items():
+        for field_type in ["int64", "float64", "datetime64"]:
+            if field_type in types and value_counts[field_name] > 0:
+                field_types[field_name] = field_type
+                break
+
+    return TableSchema(field_types)
@@ -0,0 +1,18 @@
+from .chunked_arrow import (
+    ChunkedArrow,
+    arrow_extensions,
+    is_columnar,
+    read_arrow_schema,
+    write_arrow,
+)
+from .chunked_csv import (
+    ChunkedCsv,
+    get_file_path,
+    iter_chunks,
+    select_columns,
+    unique_values,
+)
+from .compact_table import CompactTable, plan_dtypes
+from .read_arrow import read_arrow
+from .read_csv import csv_extensions, read_csv
+from .read_table import get_table_name, read_table, table_extensions
\ No newline at end of file
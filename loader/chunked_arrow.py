@@ -0,0 +1,245 @@
+from typing import Iterable, Iterator
+import numpy as np
+import pandas as pd
+from .chunked_csv import ChunkedCsv, get_file_path
+
+# columnar files that are read through pyarrow, their columns are typed by the
+# schema stored in the file
+
+arrow_extensions = (".parquet", ".feather", ".arrow")
+
+
+def import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.feather
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError(
+            "Parquet, Feather and Arrow files require the pyarrow package, install it "
+            "with pip install pyarrow"
+        )
+
+    return pyarrow
+
+
+def read_arrow_table(file_path: str, columns: list[str] | None = None):
+    # the file is memory mapped and only the given columns are read from it, the
+    # columns of uncompressed Feather/Arrow files aren't even copied
+
+    pyarrow = import_pyarrow()
+
+    if file_path.endswith(".parquet"):
+        return pyarrow.parquet.read_table(file_path, columns=columns, memory_map=True)
+
+    return pyarrow.feather.read_table(file_path, columns=columns, memory_map=True)
+
+
+def read_arrow_schema(file_path: str, columns: list[str] | None = None):
+    # the schema of the given columns, only read from the footer of the file
+
+    pyarrow = import_pyarrow()
+
+    if file_path.endswith(".parquet"):
+        schema = pyarrow.parquet.read_schema(file_path, memory_map=True)
+    else:
+        try:
+            schema = pyarrow.ipc.open_file(pyarrow.memory_map(file_path)).schema
+        except pyarrow.ArrowInvalid:
+            # Feather v1 files aren't Arrow IPC files
+            schema = read_arrow_table(file_path).schema
+
+    if columns is None:
+        return schema
+
+    return pyarrow.schema([schema.field(column) for column in columns])
+
+
+def read_arrow_batches(file_path: str, columns: list[str] | None = None) -> Iterator:
+    # the record batches of the given columns of a Feather or Arrow file as they
+    # are stored in it. The file is memory mapped and a batch is only read, and
+    # only its given columns decompressed, when it is reached. Feather v1 files
+    # aren't Arrow IPC files and are read whole
+
+    pyarrow = import_pyarrow()
+
+    try:
+        reader = pyarrow.ipc.open_file(pyarrow.memory_map(file_path))
+    except pyarrow.ArrowInvalid:
+        yield from read_arrow_table(file_path, columns).to_batches()
+        return
+
+    if columns is not None:
+        options = pyarrow.ipc.IpcReadOptions(
+            included_fields=[
+                reader.schema.get_field_index(column) for column in columns
+            ]
+        )
+        reader = pyarrow.ipc.open_file(pyarrow.memory_map(file_path), options=options)
+
+    for i in range(reader.num_record_batches):
+        batch = reader.get_batch(i)
+
+        yield batch if columns is None else batch.select(columns)
+
+
+def rebatch(batches: Iterable, chunksize: int) -> Iterator:
+    # tables of chunksize rows, the last one possibly fewer, from batches of any
+    # size. Batches are only sliced, not copied
+
+    pyarrow = import_pyarrow()
+    pending = []
+    pending_rows = 0
+
+    for batch in batches:
+        while batch.num_rows > 0:
+            rows = min(chunksize - pending_rows, batch.num_rows)
+            pending.append(batch.slice(0, rows))
+            pending_rows += rows
+            batch = batch.slice(rows)
+
+            if pending_rows == chunksize:
+                yield pyarrow.Table.from_batches(pending)
+                pending = []
+                pending_rows = 0
+
+    if pending:
+        yield pyarrow.Table.from_batches(pending)
+
+
+def write_arrow(chunks: Iterable[pd.DataFrame], file_path: str, schema):
+    # writes the chunks to a Parquet, or otherwise a Feather (v2) file, with the
+    # given schema so the columns keep the types they were read with
+
+    pyarrow = import_pyarrow()
+    schema = schema.remove_metadata()
+
+    if file_path.endswith(".parquet"):
+        writer = pyarrow.parquet.ParquetWriter(file_path, schema)
+    else:
+        writer = pyarrow.ipc.new_file(
+            file_path, schema, options=pyarrow.ipc.IpcWriteOptions(compression="lz4")
+        )
+
+    with writer:
+        for chunk in chunks:
+            writer.write_table(
+                pyarrow.Table.from_pandas(chunk, schema, preserve_index=False)
+            )
+
+
+def fill_missing_values(df: pd.DataFrame) -> pd.DataFrame:
+    # pyarrow leaves None for the missing values of object and categorical columns,
+    # they become NaN object columns like in the dataframes pandas reads from csvs
+
+    for column, dtype in df.dtypes.items():
+        if dtype == object or isinstance(dtype, pd.CategoricalDtype):
+            values = df[column].astype(object)
+            df[column] = values.where(values.notna(), np.nan)
+
+    return df
+
+
+def to_pandas(table) -> pd.DataFrame:
+    # the columns get the numpy dtypes of the arrow types like the columns of csvs,
+    # not the nullable or categorical dtypes in the metadata of files written by
+    # pandas, and dates become datetime64 columns
+
+    return fill_missing_values(
+        table.to_pandas(date_as_object=False, ignore_metadata=True)
+    )
+
+
+def is_columnar(df: pd.DataFrame | ChunkedCsv) -> bool:
+    # whether a table was read from a columnar file, whose string columns are known
+    # to hold strings
+
+    file_path = get_file_path(df)
+
+    return file_path is not None and file_path.endswith(arrow_extensions)
+
+
+class ChunkedArrow(ChunkedCsv):
+    """
+    Lazily read Parquet, Feather or Arrow file that behaves like a ChunkedCsv.
+
+    The dtypes come from the schema of the file, widened the way pandas does for
+    columns with missing values (integers to float64, booleans to object) so every
+    chunk gets the same dtypes as reading the file in one go.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        chunksize: int,
+        columns: list[str] | None = None,
+        dtypes: pd.Series | None = None,
+        row_count: int | None = None,
+    ):
+        super().__init__(file_path, chunksize, dtypes, row_count, columns)
+
+    def select(self, columns: list[str]) -> "ChunkedArrow":
+        return ChunkedArrow(
+            self.file_path,
+            self.chunksize,
+            columns,
+            self.dtypes[columns],
+            self.row_count,
+        )
+
+    def batches(self):
+        # batches of chunksize rows, the batches Feather and Arrow files are stored
+        # in are read one at a time and sliced into them
+
+        if self.file_path.endswith(".parquet"):
+            pyarrow = import_pyarrow()
+            parquet_file = pyarrow.parquet.ParquetFile(self.file_path, memory_map=True)
+
+            yield from parquet_file.iter_batches(
+                self.chunksize, columns=self.projection
+            )
+        else:
+            yield from rebatch(
+                read_arrow_batches(self.file_path, self.projection), self.chunksize
+            )
+
+    def scan(self) -> tuple[pd.Series, int]:
+        null_counts = {}
+        row_count = 0
+        schema = None
+
+        for batch in self.batches():
+            schema = batch.schema
+            row_count += batch.num_rows
+
+            for column, values in zip(batch.schema.names, batch.columns):
+                null_counts[column] = null_counts.get(column, 0) + values.null_count
+
+        if schema is None:
+            schema = read_arrow_schema(self.file_path, self.projection)
+
+        dtypes = to_pandas(schema.empty_table()).dtypes
+
+        for column, dtype in dtypes.items():
+            if null_counts.get(column, 0) == 0:
+                continue
+
+            if pd.api.types.is_bool_dtype(dtype):
+                dtypes[column] = np.dtype(object)
+            elif pd.api.types.is_integer_dtype(dtype):
+                dtypes[column] = np.dtype("float64")
+
+        return dtypes, row_count
+
+    def head(self, n: int = 5) -> pd.DataFrame:
+        for chunk in self.chunks():
+            return chunk.head(n)
+
+        return to_pandas(
+            read_arrow_schema(self.file_path, self.projection).empty_table()
+        ).astype(dict(self.dtypes))
+
+    def chunks(self) -> Iterator[pd.DataFrame]:
+        for batch in self.batches():
+            yield to_pandas(batch).astype(dict(self.dtypes))
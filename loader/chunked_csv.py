@@ -0,0 +1,179 @@
+from typing import Iterator
+import numpy as np
+import pandas as pd
+
+
+def merge_dtypes(dtype_1: np.dtype, dtype_2: np.dtype) -> np.dtype:
+    # the dtype pandas infers for a column whose values span both chunks
+
+    if dtype_1 == dtype_2:
+        return dtype_1
+
+    if all(
+        pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+        for dtype in (dtype_1, dtype_2)
+    ):
+        return np.result_type(dtype_1, dtype_2)
+
+    return np.dtype(object)
+
+
+class ChunkedCsv:
+    """
+    Lazily read CSV that behaves like a DataFrame for the exporters.
+
+    The file is scanned once up front so that the dtypes seen by the exporters
+    are the ones pandas would infer for the whole file. Every chunk is then read
+    with those dtypes forced, which keeps the output identical to reading the
+    file in one go while only holding `chunksize` rows in memory.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        chunksize: int,
+        dtypes: pd.Series | None = None,
+        row_count: int | None = None,
+        columns: list[str] | None = None,
+    ):
+        # dtypes and row_count can be given from an earlier scan of the same file,
+        # with columns only those columns of the file are read
+
+        self.file_path = file_path
+        self.chunksize = chunksize
+        self.projection = columns
+
+        if dtypes is None or row_count is None:
+            dtypes, row_count = self.scan()
+
+        self.dtypes = dtypes
+        self.row_count = row_count
+
+    @property
+    def columns(self) -> pd.Index:
+        return self.dtypes.index
+
+    def __len__(self) -> int:
+        return self.row_count
+
+    def scan(self) -> tuple[pd.Series, int]:
+        column_types = {}
+        row_count = 0
+
+        with pd.read_csv(
+            self.file_path, chunksize=self.chunksize, usecols=self.projection
+        ) as reader:
+            for chunk in reader:
+                row_count += len(chunk)
+
+                for column, dtype in chunk.dtypes.items():
+                    if column in column_types:
+                        dtype = merge_dtypes(column_types[column], dtype)
+
+                    column_types[column] = dtype
+
+        if row_count == 0:
+            df = pd.read_csv(self.file_path, nrows=0, usecols=self.projection)
+
+            return df.dtypes, 0
+
+        return pd.Series(column_types, dtype=object), row_count
+
+    def head(self, n: int = 5) -> pd.DataFrame:
+        return pd.read_csv(
+            self.file_path,
+            nrows=n,
+            dtype=dict(self.dtypes),
+            usecols=self.projection,
+        )
+
+    def chunks(self) -> Iterator[pd.DataFrame]:
+        with pd.read_csv(
+            self.file_path,
+            chunksize=self.chunksize,
+            dtype=dict(self.dtypes),
+            usecols=self.projection,
+        ) as reader:
+            yield from reader
+
+    def split(self, chunksize: int | None = None) -> Iterator[pd.DataFrame]:
+        # files are read in chunks of their own chunksize, which are split again
+        # when a smaller chunksize is given
+
+        for chunk in self.chunks():
+            yield from split_frame(chunk, chunksize)
+
+    def select(self, columns: list[str]) -> "ChunkedCsv":
+        # the table of the given columns, without scanning the file again
+
+        return ChunkedCsv(
+            self.file_path,
+            self.chunksize,
+            self.dtypes[columns],
+            self.row_count,
+            columns,
+        )
+
+
+def get_file_path(df: pd.DataFrame | ChunkedCsv) -> str | None:
+    # the csv a table was read from, main.py keeps it in the attrs of dataframes
+
+    if isinstance(df, pd.DataFrame):
+        return df.attrs.get("file_path")
+
+    return df.file_path
+
+
+def select_columns(
+    df: pd.DataFrame | ChunkedCsv, columns: list[str]
+) -> pd.DataFrame | ChunkedCsv:
+    # the given columns of a table, chunked tables only read those columns of
+    # their file
+
+    if isinstance(df, pd.DataFrame):
+        return df[columns]
+
+    return df.select(columns)
+
+
+def split_frame(
+    df: pd.DataFrame, chunksize: int | None = None
+) -> Iterator[pd.DataFrame]:
+    if chunksize is None or len(df) <= chunksize:
+        yield df
+    else:
+        for start in range(0, len(df), chunksize):
+            yield df.iloc[start : start + chunksize]
+
+
+def iter_chunks(
+    df: pd.DataFrame | ChunkedCsv, chunksize: int | None = None
+) -> Iterator[pd.DataFrame]:
+    # dataframes are only split when a chunksize is given, every table yields at
+    # least one (possibly empty) chunk
+
+    if isinstance(df, pd.DataFrame):
+        yield from split_frame(df, chunksize)
+        return
+
+    is_empty = True
+
+    for chunk in df.split(chunksize):
+        is_empty = False
+        yield chunk
+
+    if is_empty:
+        yield df.head(0)
+
+
+def unique_values(df: pd.DataFrame | ChunkedCsv, field_name: str) -> list:
+    # distinct values in order of first appearance, so the result does not
+    # depend on how the file was split into chunks
+
+    values = {}
+
+    for chunk in iter_chunks(df):
+        for val in pd.unique(chunk[field_name]):
+            values.setdefault(val, None)
+
+    return list(values)
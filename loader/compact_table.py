@@ -0,0 +1,127 @@
+from typing import Iterator
+import numpy as np
+import pandas as pd
+from .chunked_csv import split_frame
+
+# integer types tried in turn for the columns of a compact table
+
+integer_types = [np.int8, np.int16, np.int32]
+
+
+def get_integer_type(values: pd.Series) -> np.dtype | None:
+    # the smallest integer type that holds every value, None when it is the
+    # column's own type
+
+    if len(values) == 0:
+        return None
+
+    low, high = values.min(), values.max()
+
+    for integer_type in integer_types:
+        info = np.iinfo(integer_type)
+
+        if np.dtype(integer_type).itemsize >= values.dtype.itemsize:
+            return None
+
+        if info.min <= low and high <= info.max:
+            return np.dtype(integer_type)
+
+    return None
+
+
+def plan_dtypes(df: pd.DataFrame, max_category_ratio: float = 0.5) -> dict:
+    """
+    Plan the compact dtypes of a table's columns.
+
+    :param df: DataFrame, the table
+    :param max_category_ratio: float, string columns with at most this many distinct
+        values per row, like the collection field of junction tables, become
+        categoricals
+    :return: dict, the compact dtype of every column that has one, integer columns
+        get the smallest integer type holding their values
+    """
+    dtypes = {}
+
+    for column, dtype in df.dtypes.items():
+        values = df[column]
+
+        if pd.api.types.is_integer_dtype(dtype):
+            integer_type = get_integer_type(values)
+
+            if integer_type is not None:
+                dtypes[column] = integer_type
+        elif (
+            dtype == object
+            and len(values) > 0
+            and values.nunique() <= max_category_ratio * len(values)
+            and pd.api.types.infer_dtype(values, skipna=True) == "string"
+        ):
+            # only strings, which never compare equal to values of other types,
+            # are converted back to the same objects
+            dtypes[column] = "category"
+
+    return dtypes
+
+
+class CompactTable:
+    """
+    Table held in memory with compact dtypes that behaves like the DataFrame it was
+    planned from.
+
+    The columns are kept in the dtypes of plan_dtypes and only converted back to
+    the DataFrame's dtypes a chunk at a time, so the exporters see the same values
+    while the whole table is only held compacted. Like a ChunkedCsv the table is
+    always split into chunks of at most chunksize rows, so only one chunk at a time
+    is held with the DataFrame's dtypes.
+    """
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        dtypes: pd.Series | None = None,
+        file_path: str | None = None,
+        chunksize: int = 100_000,
+    ):
+        # with dtypes df already holds the compact columns of a table with those
+        # dtypes, e.g. some columns of another compact table, otherwise its compact
+        # dtypes are planned from its values
+
+        if dtypes is None:
+            self.df = df.astype(plan_dtypes(df))
+            self.dtypes = df.dtypes
+            self.file_path = df.attrs.get("file_path")
+        else:
+            self.df = df
+            self.dtypes = dtypes
+            self.file_path = file_path
+
+        self.chunksize = chunksize
+
+    @property
+    def columns(self) -> pd.Index:
+        return self.dtypes.index
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    def get_memory_usage(self) -> int:
+        return int(self.df.memory_usage(deep=True).sum())
+
+    def head(self, n: int = 5) -> pd.DataFrame:
+        return self.df.head(n).astype(dict(self.dtypes))
+
+    def chunks(self) -> Iterator[pd.DataFrame]:
+        return self.split()
+
+    def split(self, chunksize: int | None = None) -> Iterator[pd.DataFrame]:
+        # the table's own chunksize bounds the chunks when none is given
+
+        chunksize = chunksize if chunksize is not None else self.chunksize
+
+        for chunk in split_frame(self.df, chunksize):
+            yield chunk.astype(dict(self.dtypes))
+
+    def select(self, columns: list[str]) -> "CompactTable":
+        return CompactTable(
+            self.df[columns], self.dtypes[columns], self.file_path, self.chunksize
+        )
@@ -0,0 +1,22 @@
+import pandas as pd
+from .chunked_arrow import ChunkedArrow, read_arrow_table, to_pandas
+
+
+def read_arrow(
+    file_path: str, chunksize: int | None = None, columns: list[str] | None = None
+) -> pd.DataFrame | ChunkedArrow:
+    """
+    Read a Parquet, Feather or Arrow file into a DataFrame, or into a ChunkedArrow
+    when a chunksize is given.
+
+    :param file_path: str, path of the file
+    :param chunksize: int, rows per chunk when streaming the file
+    :param columns: list, only read these columns of the file
+    """
+    if chunksize is not None:
+        return ChunkedArrow(file_path, chunksize, columns)
+
+    df = to_pandas(read_arrow_table(file_path, columns))
+    df.attrs["file_path"] = file_path
+
+    return df
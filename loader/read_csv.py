@@ -0,0 +1,77 @@
+import json
+import numpy as np
+import pandas as pd
+from pandas._libs.parsers import STR_NA_VALUES
+from cache import Cache
+from .chunked_arrow import fill_missing_values
+from .chunked_csv import ChunkedCsv
+
+# pandas infers the compression of a csv from its extension, zstd compressed csvs
+# need the zstandard package
+
+csv_extensions = (".csv", ".csv.gz", ".csv.bz2", ".csv.zst")
+
+
+def fill_missing_strings(df: pd.DataFrame) -> pd.DataFrame:
+    # pyarrow only reads the values pandas takes as missing (e.g. empty cells) as
+    # nulls in columns that aren't strings, they become NaN in string columns too
+    # and columns without any other values are float64 like with the c engine
+
+    for column, dtype in df.dtypes.items():
+        if dtype != object:
+            continue
+
+        values = df[column].mask(df[column].isin(STR_NA_VALUES))
+        df[column] = values.astype("float64") if values.isna().all() else values
+
+    return df
+
+
+def read_csv(
+    file_path: str,
+    chunksize: int | None = None,
+    cache: Cache | None = None,
+    engine: str = "c",
+) -> pd.DataFrame | ChunkedCsv:
+    """
+    Read a csv into a DataFrame, or into a ChunkedCsv when a chunksize is given.
+
+    :param file_path: str, path of the csv, optionally compressed
+    :param chunksize: int, rows per chunk when streaming the csv
+    :param cache: Cache, reuses the dtypes and row count of an earlier scan of the
+        csv when streaming it
+    :param engine: str, pandas parser engine of whole csvs, streamed csvs are always
+        read with the c engine as the pyarrow engine can't read chunks
+    """
+    if chunksize is None:
+        df = pd.read_csv(file_path, engine=engine)
+
+        if engine == "pyarrow":
+            df = fill_missing_strings(fill_missing_values(df))
+
+        df.attrs["file_path"] = file_path
+
+        return df
+
+    key = cache.get_key("scan", file_path, chunksize) if cache is not None else None
+    scan = cache.get(key) if cache is not None else None
+
+    if scan is not None:
+        scan = json.loads(scan)
+        dtypes = pd.Series(
+            {column: np.dtype(dtype) for column, dtype in scan["dtypes"].items()},
+            dtype=object,
+        )
+
+        return ChunkedCsv(file_path, chunksize, dtypes, scan["row_count"])
+
+    df = ChunkedCsv(file_path, chunksize)
+
+    if cache is not None:
+        scan = {
+            "dtypes": {column: str(dtype) for column, dtype in df.dtypes.items()},
+            "row_count": df.row_count,
+        }
+        cache.put(key, json.dumps(scan))
+
+    return df
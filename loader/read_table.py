@@ -0,0 +1,32 @@
+import pandas as pd
+from cache import Cache
+from .chunked_arrow import arrow_extensions
+from .chunked_csv import ChunkedCsv
+from .read_arrow import read_arrow
+from .read_csv import csv_extensions, read_csv
+
+table_extensions = csv_extensions + arrow_extensions
+
+
+def get_table_name(file_name: str) -> str | None:
+    # the name of the table a file holds, None for files that aren't tables
+
+    for extension in table_extensions:
+        if file_name.endswith(extension):
+            return file_name[: -len(extension)]
+
+    return None
+
+
+def read_table(
+    file_path: str,
+    chunksize: int | None = None,
+    cache: Cache | None = None,
+    csv_engine: str = "c",
+) -> pd.DataFrame | ChunkedCsv:
+    # columnar files are read through pyarrow, csvs with the given pandas engine
+
+    if file_path.endswith(arrow_extensions):
+        return read_arrow(file_path, chunksize)
+
+    return read_csv(file_path, chunksize, cache, csv_engine)
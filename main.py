@@ -4,9 +4,29 @@ import argparse
 import pandas as pd
 import inquirer
 
-from RDF import rdf_exporter
+from RDF import ntriples_exporter, rdf_exporter
 from redis_graph import RedisGraph
-from d2rq import d2rq_exporter
+from d2rq import d2rq_exporter, sqlite_exporter
+from cypher import cypher_exporter
+from cache import Cache, Manifest
+from data_cleaner import infer_schema
+from loader import (
+    ChunkedCsv,
+    CompactTable,
+    get_file_path,
+    get_table_name,
+    read_table,
+)
+from output import get_output_path, parse_size, read_shard_paths
+from parallel import WorkerPool
+from profiler import Profiler
+from validation import (
+    IdIndex,
+    SqliteIdIndex,
+    drop_invalid_rows,
+    print_report,
+    validate_references,
+)
 
 print("CSV2Graph")
 
@@ -26,11 +46,170 @@ parser.add_argument(
     "--graphtype",
     dest="graphtype",
     default="rdf",
-    help="Type of Graph to export to",
+    help="Type of Graph to export to, or several separated by commas",
+)
+parser.add_argument(
+    "-cs",
+    "--chunksize",
+    dest="chunksize",
+    type=int,
+    default=None,
+    help="Stream each CSV in chunks of this many rows instead of loading it whole",
+)
+parser.add_argument(
+    "-w",
+    "--workers",
+    dest="workers",
+    type=int,
+    default=1,
+    help="Number of processes to convert the CSVs with",
+)
+parser.add_argument(
+    "--csvengine",
+    dest="csvengine",
+    choices=["c", "pyarrow"],
+    default="c",
+    help="Pandas engine to parse whole CSVs with, pyarrow needs the pyarrow package",
+)
+parser.add_argument(
+    "--compactdtypes",
+    dest="compactdtypes",
+    action="store_true",
+    help="Hold whole tables with categorical and downcast integer columns and report the memory saved",
+)
+parser.add_argument(
+    "--pipeline",
+    dest="pipeline",
+    action="store_true",
+    help="Read, convert and write the chunks concurrently and report each stage's utilization",
+)
+parser.add_argument(
+    "--queuesize",
+    dest="queuesize",
+    type=int,
+    default=8,
+    help="Number of chunks read ahead of their conversion in --pipeline mode",
+)
+parser.add_argument(
+    "-ss",
+    "--samplesize",
+    dest="samplesize",
+    type=int,
+    default=None,
+    help="Infer the field types of each CSV from at most this many rows",
+)
+parser.add_argument(
+    "-bs",
+    "--batchsize",
+    dest="batchsize",
+    type=int,
+    default=1000,
+    help="Number of rows in each UNWIND (cypher) or INSERT (d2rq) statement",
+)
+parser.add_argument(
+    "--sqlload",
+    dest="sqlload",
+    choices=["insert", "infile", "none"],
+    default="insert",
+    help="Load the rows of the d2rq export with INSERT or LOAD DATA statements",
+)
+parser.add_argument(
+    "--validate",
+    dest="validate",
+    choices=["report", "drop", "none"],
+    default="report",
+    help="Report or drop duplicate node ids and edges to missing nodes before exporting",
+)
+parser.add_argument(
+    "--engine",
+    dest="engine",
+    choices=["memory", "sqlite"],
+    default="memory",
+    help="Keep the node id index of --validate and --compactids in memory or in a temporary sqlite file",
+)
+parser.add_argument(
+    "--groupedges",
+    dest="groupedges",
+    action="store_true",
+    help="Write the relations of every subject as one turtle statement with object lists",
+)
+parser.add_argument(
+    "--compactids",
+    dest="compactids",
+    action="store_true",
+    help="Replace the node ids of the redisgraph csvs with dense integer codes",
+)
+parser.add_argument(
+    "--no-cache",
+    dest="no_cache",
+    action="store_true",
+    help="Don't read or write the .csv2graph_cache directory of the dataset",
+)
+parser.add_argument(
+    "--cache-output",
+    dest="cache_output",
+    action="store_true",
+    help="Also cache the turtle statements of every csv to reuse while it is unchanged",
+)
+parser.add_argument(
+    "--clear-cache",
+    dest="clear_cache",
+    action="store_true",
+    help="Empty the .csv2graph_cache directory of the dataset before running",
+)
+parser.add_argument(
+    "--profile",
+    dest="profile",
+    action="store_true",
+    help="Write the time, rows, bytes and memory of every stage to csv2graph_profile.json",
+)
+parser.add_argument(
+    "--cprofile",
+    dest="cprofile",
+    default=None,
+    help="Profile every stage and dump the cProfile stats of the slowest to this path",
+)
+parser.add_argument(
+    "--compress",
+    dest="compress",
+    choices=["gzip", "bz2", "zstd"],
+    default=None,
+    help="Compress the output files on a background thread while they are written, "
+    "except the redisgraph csvs which the bulk loader can't read compressed",
+)
+parser.add_argument(
+    "--max-shard-size",
+    dest="max_shard_size",
+    type=parse_size,
+    default=None,
+    help="Split the turtle file and redisgraph csvs into shards of at most this many bytes, e.g. 512M",
+)
+parser.add_argument(
+    "--max-shard-rows",
+    dest="max_shard_rows",
+    type=int,
+    default=None,
+    help="Split the turtle file and redisgraph csvs into shards of at most this many rows",
+)
+parser.add_argument(
+    "--incremental",
+    dest="incremental",
+    action="store_true",
+    help="Only regenerate the output of CSVs that changed since the last run",
 )
 
 args = parser.parse_args()
 
+# zstd is the one compression without a module of the standard library
+if args.compress == "zstd":
+    try:
+        import zstandard
+    except ImportError:
+        parser.error(
+            "--compress zstd requires the zstandard package, install it with "
+            "pip install zstandard"
+        )
+
 # the three variables below are required to run all of the converters
 # (RDF, D2RQ, Cypher, Redis Bulk Loader)
 
@@ -84,7 +263,15 @@ if args.input:
             inquirer.List(
                 "graph_type",
                 message="What graph type would like to export to?",
-                choices=["rdf", "d2rq (MySQL)", "cypher", "redisgraph"],
+                choices=[
+                    "rdf",
+                    "ntriples",
+                    "nquads",
+                    "d2rq (MySQL)",
+                    "sqlite",
+                    "cypher",
+                    "redisgraph",
+                ],
             ),
         ]
     )["graph_type"]
@@ -95,38 +282,314 @@ else:
     graph_name = args.graphname
     graph_type = args.graphtype
 
+# a comma separated list of graph types is exported in a single run
+
+graph_type_names = [
+    "rdf",
+    "ntriples",
+    "nquads",
+    "d2rq",
+    "sqlite",
+    "cypher",
+    "redisgraph",
+]
+graph_types = [graph_type.strip() for graph_type in graph_type.split(",")]
+
+if not all(graph_type in graph_type_names for graph_type in graph_types):
+    print(
+        "Invalid graph type please input one or more of the following separated by commas: "
+        + ", ".join(graph_type_names)
+    )
+    exit(1)
+
+# schemas and conversions derived from the csvs are cached next to the dataset and
+# reused while the csvs are unchanged, the turtle statements only with --cache-output
+
+cache_dir_path = f"{csvs_dir_path}/.csv2graph_cache"
+
+if args.clear_cache:
+    Cache(cache_dir_path).clear()
+
+cache = (
+    Cache(cache_dir_path, key_params=(args.csvengine,)) if not args.no_cache else None
+)
+
+# with --incremental the outputs every csv produced are recorded in a manifest next to
+# the dataset and only regenerated when the csv changed
+
+manifest = (
+    Manifest(f"{csvs_dir_path}/.csv2graph_manifest.json") if args.incremental else None
+)
+
+# with --profile every stage below is timed and measured, the report is written next
+# to the dataset at the end of the run
+
+profiler = Profiler(args.profile, args.cprofile)
+
 # reading csvs into dataframes and storing them in the dicts below using their file_name
-# which will represent their dataframe name
+# which will represent their dataframe name, when a chunksize is given the csvs are
+# only scanned here and streamed chunk by chunk by the exporters. Csvs compressed
+# with gzip, bz2 or zstd are read as they are, Parquet, Feather and Arrow files are
+# memory mapped and read through pyarrow with the types of their schema
 
 node_dfs = {}
 relation_dfs = {}
+memory_usage = {"before": 0, "after": 0}
 
-for file_name in os.listdir(nodes_dir_path):
-    if file_name.endswith(".csv"):
-        node_dfs[file_name.replace(".csv", "")] = pd.read_csv(
-            f"{nodes_dir_path}/{file_name}"
-        )
 
-for file_name in os.listdir(edges_dir_path):
-    if file_name.endswith(".csv"):
-        relation_dfs[file_name.replace(".csv", "")] = pd.read_csv(
-            f"{edges_dir_path}/{file_name}"
-        )
+def compact_table(df: pd.DataFrame | ChunkedCsv) -> pd.DataFrame | ChunkedCsv:
+    # with --compactdtypes whole tables are held with the compact dtypes planned
+    # from their values, the exporters still see the dtypes they were read with
 
-match graph_type:
-    case "rdf":
-        rdf_exporter(graph_name, node_dfs, relation_dfs, csvs_dir_path)
-    case "d2rq":
-        d2rq_exporter(graph_name, node_dfs, relation_dfs, csvs_dir_path)
-    case "cypher":
-        pass
-    case "redisgraph":
-        redisGraph = RedisGraph(
-            graph_name, node_dfs, relation_dfs, csvs_dir_path, False
-        )
-        redisGraph.write_bulk_csvs()
-    case _:
-        print(
-            "Invalid graph type please input one of the following: rdf, d2rq, cypher, redisgraph"
+    if not args.compactdtypes or not isinstance(df, pd.DataFrame):
+        return df
+
+    memory_usage["before"] += int(df.memory_usage(deep=True).sum())
+    df = CompactTable(df)
+    memory_usage["after"] += df.get_memory_usage()
+
+    return df
+
+
+for dir_path, dfs in [(nodes_dir_path, node_dfs), (edges_dir_path, relation_dfs)]:
+    for file_name in os.listdir(dir_path):
+        table_name = get_table_name(file_name)
+
+        if table_name is not None:
+            with profiler.stage("load", f"{dir_path}/{file_name}") as stage:
+                df = compact_table(
+                    read_table(
+                        f"{dir_path}/{file_name}", args.chunksize, cache, args.csvengine
+                    )
+                )
+                stage["rows"] = len(df)
+
+            dfs[table_name] = df
+
+if args.compactdtypes:
+    print(
+        f"Compact dtypes: {memory_usage['before'] / 2**20:.1f} MB of tables held in "
+        f"{memory_usage['after'] / 2**20:.1f} MB"
+    )
+
+# every node id is looked up in an index of the node tables' ids before exporting,
+# duplicate ids and edges to missing nodes are reported and with "drop" the tables
+# are exported without them. With --compactids the same index gives every node the
+# dense integer code that replaces its id in the redisgraph csvs. With the sqlite
+# engine the index is built in a temporary file next to the dataset and the edges
+# are looked up in it chunk by chunk, for node tables with more ids than fit in memory
+
+id_index = None
+
+if args.validate != "none" or (args.compactids and "redisgraph" in graph_types):
+    with profiler.stage("index") as stage:
+        id_index = (
+            SqliteIdIndex(node_dfs, csvs_dir_path)
+            if args.engine == "sqlite"
+            else IdIndex(node_dfs)
         )
-        exit(1)
+        stage["rows"] = sum([len(df) for df in node_dfs.values()])
+
+if args.validate != "none":
+    with profiler.stage("validate") as stage:
+        report = validate_references(node_dfs, relation_dfs, id_index)
+        stage["rows"] = sum([len(df) for df in {**node_dfs, **relation_dfs}.values()])
+
+        print_report(report)
+
+        if args.validate == "drop":
+            node_dfs, relation_dfs = drop_invalid_rows(
+                node_dfs,
+                relation_dfs,
+                report,
+                id_index,
+                f"{csvs_dir_path}/.csv2graph_validated",
+                args.chunksize,
+                cache,
+            )
+            node_dfs = {df_name: compact_table(df) for df_name, df in node_dfs.items()}
+            relation_dfs = {
+                df_name: compact_table(df) for df_name, df in relation_dfs.items()
+            }
+
+# the index is only kept in memory for compacting the ids of the redisgraph csvs
+
+if not args.compactids and id_index is not None:
+    id_index.close()
+    id_index = None
+
+# in pipeline mode the chunks the exporters convert are read on a thread of their
+# own and converted on the pool while the results of earlier chunks are written. A
+# shard can only end between two chunks so with shards every table is converted in
+# chunks, of at most --max-shard-rows rows
+
+is_sharded = args.max_shard_size is not None or args.max_shard_rows is not None
+
+pool = WorkerPool(
+    args.workers,
+    min(100_000, args.max_shard_rows or 100_000),
+    args.pipeline,
+    args.queuesize,
+    is_sharded,
+)
+
+
+def get_schemas(dfs: dict[str, pd.DataFrame | ChunkedCsv]):
+    schemas = {}
+
+    for df_name, df in dfs.items():
+        with profiler.stage("schema", get_file_path(df)) as stage:
+            schemas[df_name] = infer_schema(df, args.samplesize, cache)
+            stage["rows"] = len(df)
+
+    return schemas
+
+
+# several graph types can be exported from the same tables, the csvs are read,
+# validated and their schemas inferred once for all of them. The exporters only
+# read the shared tables
+
+schema_dfs = {}
+
+for graph_type in graph_types:
+    schema_dfs.update(
+        {
+            "d2rq": {**node_dfs, **relation_dfs},
+            "sqlite": {**node_dfs, **relation_dfs},
+            "redisgraph": node_dfs,
+        }.get(graph_type, {})
+    )
+
+schemas = get_schemas(schema_dfs)
+
+output_paths = {
+    "rdf": [get_output_path(f"{csvs_dir_path}/{graph_name}.ttl", args.compress)],
+    "ntriples": [f"{csvs_dir_path}/{graph_name}_nt"],
+    "nquads": [f"{csvs_dir_path}/{graph_name}_nq"],
+    "d2rq": [get_output_path(f"{csvs_dir_path}/{graph_name}.sql", args.compress)],
+    "sqlite": [f"{csvs_dir_path}/{graph_name}.sqlite"],
+    "cypher": [get_output_path(f"{csvs_dir_path}/{graph_name}.cypher", args.compress)],
+    "redisgraph": [f"{csvs_dir_path}/redis_bulk_csvs"],
+}
+
+for graph_type in graph_types:
+    # the export of every graph type is a stage of its own, recorded with its
+    # output file and the seconds the pool spent reading, converting (serializing)
+    # and writing
+
+    pool.reset_utilization()
+
+    with profiler.stage(
+        f"export {graph_type}",
+        output_paths[graph_type][0],
+        output_paths[graph_type],
+    ) as stage:
+        stage["rows"] = sum([len(df) for df in {**node_dfs, **relation_dfs}.values()])
+
+        match graph_type:
+            case "rdf":
+                rdf_exporter(
+                    graph_name,
+                    node_dfs,
+                    relation_dfs,
+                    csvs_dir_path,
+                    pool=pool,
+                    cache=cache if args.cache_output else None,
+                    manifest=manifest,
+                    compression=args.compress,
+                    max_shard_size=args.max_shard_size,
+                    max_shard_rows=args.max_shard_rows,
+                    group_edges=args.groupedges,
+                )
+
+                # the shards are only known once they are written, the stage
+                # measures the paths in its list when it is done
+
+                if is_sharded:
+                    output_paths["rdf"][:] = read_shard_paths(
+                        f"{csvs_dir_path}/{graph_name}_shards.json"
+                    )
+            case "ntriples" | "nquads":
+                ntriples_exporter(
+                    graph_name,
+                    node_dfs,
+                    relation_dfs,
+                    csvs_dir_path,
+                    graph_type == "nquads",
+                    pool,
+                    args.compress,
+                )
+            case "d2rq":
+                d2rq_exporter(
+                    graph_name,
+                    node_dfs,
+                    relation_dfs,
+                    csvs_dir_path,
+                    pool,
+                    schemas,
+                    cache,
+                    args.sqlload,
+                    args.batchsize,
+                    args.compress,
+                )
+            case "sqlite":
+                sqlite_exporter(
+                    graph_name,
+                    node_dfs,
+                    relation_dfs,
+                    csvs_dir_path,
+                    pool,
+                    schemas,
+                    cache,
+                )
+            case "cypher":
+                cypher_exporter(
+                    graph_name,
+                    node_dfs,
+                    relation_dfs,
+                    csvs_dir_path,
+                    args.batchsize,
+                    pool=pool,
+                    compression=args.compress,
+                )
+            case "redisgraph":
+                redisGraph = RedisGraph(
+                    graph_name,
+                    node_dfs,
+                    relation_dfs,
+                    csvs_dir_path,
+                    False,
+                    pool,
+                    schemas,
+                    manifest,
+                    args.compress,
+                    id_index,
+                    args.max_shard_size,
+                    args.max_shard_rows,
+                )
+                redisGraph.write_bulk_csvs()
+
+        stage["utilization"] = pool.get_utilization()
+
+        if args.pipeline:
+            for stage_name, utilization in stage["utilization"].items():
+                print(
+                    f"{stage_name}: {utilization['busy_seconds']:.2f}s busy, "
+                    f"{utilization['utilization']:.0%} utilization"
+                )
+
+pool.close()
+
+if id_index is not None:
+    id_index.close()
+
+if manifest is not None:
+    manifest.save()
+
+if cache is not None:
+    cache.save()
+    print(cache.get_stats())
+
+if profiler.enabled:
+    profiler.save(f"{csvs_dir_path}/csv2graph_profile.json")
+    print(f"Written csv2graph_profile.json to {csvs_dir_path}")
@@ -0,0 +1,14 @@
+from .sharded_writer import (
+    ShardedWriter,
+    parse_size,
+    read_shard_paths,
+    split_to_size,
+    write_shard_manifest,
+)
+from .statement_writer import StatementWriter
+from .threaded_writer import (
+    ThreadedWriter,
+    compression_suffixes,
+    get_output_path,
+    open_output,
+)
@@ -0,0 +1,171 @@
+import json
+import os
+from typing import IO, Callable
+import pandas as pd
+from .threaded_writer import ThreadedWriter, get_output_path, open_output
+
+# multipliers of the suffixes accepted by parse_size
+
+size_units = {"K": 2**10, "M": 2**20, "G": 2**30, "T": 2**40}
+
+
+def parse_size(size: str) -> int:
+    # a number of bytes, optionally with a K, M, G or T suffix (e.g. 512M)
+
+    size = size.strip().upper().removesuffix("B")
+
+    if size[-1:] in size_units:
+        return int(float(size[:-1]) * size_units[size[-1]])
+
+    return int(size)
+
+
+class ShardedWriter:
+    """
+    Text file that is split into numbered shards while it is written.
+
+    A shard is closed and the next one opened before a write that would take it
+    past max_size bytes (of uncompressed text) or max_rows rows. Shards are only
+    started between writes so whatever is written at once, like the csv rows or
+    turtle statements of a chunk, stays whole in one shard, and a single write
+    larger than the limits gets a shard of its own. The header is repeated at the
+    start of every shard so each can be loaded by itself.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        max_size: int | None = None,
+        max_rows: int | None = None,
+        header: str = "",
+        compression: str | None = None,
+    ):
+        self.base_path, self.extension = os.path.splitext(file_path)
+        self.max_size = max_size
+        self.max_rows = max_rows
+        self.header = header
+        self.compression = compression
+        self.file: IO[str] | ThreadedWriter | None = None
+        self.shards: list[dict] = []
+
+    @staticmethod
+    def get_size(text: str) -> int:
+        # utf-8 bytes of the text, only ascii text is measured without encoding it
+
+        return len(text) if text.isascii() else len(text.encode("utf-8"))
+
+    def get_shard_path(self, index: int) -> str:
+        return f"{self.base_path}-{index:05d}{self.extension}"
+
+    @property
+    def paths(self) -> list[str]:
+        return [shard["path"] for shard in self.shards]
+
+    def is_full(self, size: int, rows: int) -> bool:
+        # whether the next write has to start a new shard, a shard holding nothing
+        # but its header is never full
+
+        shard = self.shards[-1]
+
+        if shard["rows"] == 0 and shard["size"] <= self.get_size(self.header):
+            return False
+
+        return (self.max_size is not None and shard["size"] + size > self.max_size) or (
+            self.max_rows is not None and shard["rows"] + rows > self.max_rows
+        )
+
+    def open_shard(self):
+        self.close_shard()
+
+        file_path = self.get_shard_path(len(self.shards))
+        self.file = open_output(file_path, self.compression)
+        self.shards.append(
+            {
+                "path": get_output_path(file_path, self.compression),
+                "rows": 0,
+                "size": 0,
+            }
+        )
+
+        if self.header:
+            self.file.write(self.header)
+            self.shards[-1]["size"] += self.get_size(self.header)
+
+    def close_shard(self):
+        # the size of a closed shard is that of its file, which is smaller than the
+        # text written to it when it is compressed
+
+        if self.file is None:
+            return
+
+        self.file.close()
+        self.file = None
+        self.shards[-1]["size"] = os.path.getsize(self.shards[-1]["path"])
+
+    def write(self, text: str, rows: int = 0) -> int:
+        size = self.get_size(text)
+
+        if self.file is None or (rows > 0 and self.is_full(size, rows)):
+            self.open_shard()
+
+        self.file.write(text)
+        self.shards[-1]["size"] += size
+        self.shards[-1]["rows"] += rows
+
+        return len(text)
+
+    def close(self):
+        # a stream nothing was written to still gets a shard with its header
+
+        if not self.shards:
+            self.open_shard()
+
+        self.close_shard()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+def write_shard_manifest(file_path: str, writers: dict[str, ShardedWriter]):
+    # the path, rows and size of every shard of every output stream by its name
+
+    with open(file_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {name: writer.shards for name, writer in writers.items()}, f, indent=4
+        )
+
+
+def read_shard_paths(file_path: str) -> list[str]:
+    # the paths of the shards of every output stream of a shard manifest
+
+    with open(file_path, encoding="utf-8") as f:
+        return [shard["path"] for shards in json.load(f).values() for shard in shards]
+
+
+def split_to_size(
+    df: pd.DataFrame, max_size: int | None, get_text: Callable[..., str], *args
+) -> list[tuple[int, str]]:
+    # the rows and text of get_text(df, *args) in pieces of at most max_size bytes
+    # so a chunk can be divided between shards. Larger texts are generated again
+    # from parts of the rows of about half of max_size, estimated from the size of
+    # the whole text, which are split again when they are still too large. A
+    # single row is never split
+
+    text = get_text(df, *args)
+    size = ShardedWriter.get_size(text)
+
+    if max_size is None or size <= max_size or len(df) <= 1:
+        return [(len(df), text)]
+
+    rows = max(1, len(df) * max_size // (2 * size))
+
+    return [
+        piece
+        for start in range(0, len(df), rows)
+        for piece in split_to_size(
+            df.iloc[start : start + rows], max_size, get_text, *args
+        )
+    ]
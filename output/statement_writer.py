@@ -0,0 +1,163 @@
+from itertools import groupby
+from typing import IO, Callable
+import pandas as pd
+from tqdm import tqdm
+from cache import Cache
+from loader import ChunkedCsv, get_file_path
+from parallel import WorkerPool
+from .sharded_writer import ShardedWriter, split_to_size
+from .threaded_writer import ThreadedWriter
+
+
+class StatementWriter:
+    """
+    Base of the exporters that convert tables into statements chunk by chunk on a
+    WorkerPool and write them to a single output file (e.g. RDF and Cypher).
+
+    Added text is buffered and written to the file once more than flush_size
+    characters are buffered, a ShardedWriter is written one add_text at a time so
+    a shard never ends within the statements of a chunk. Worker processes only
+    build statements, the output file, the cache and the buffered text stay with
+    the main process.
+    """
+
+    # text added after the statements of every table
+    table_separator = ""
+
+    def __init__(
+        self,
+        file: IO[str] | ThreadedWriter | ShardedWriter | None,
+        flush_size: int = 2**20,
+        cache: Cache | None = None,
+        max_text_size: int | None = None,
+    ):
+        # without a file the text is kept in memory. With a cache the statements of
+        # every table are kept in it and reused while the table is unchanged, with
+        # a max_text_size the statements of a chunk are split into pieces of at
+        # most max_text_size bytes
+
+        self.file = file
+        self.flush_size = flush_size
+        self.cache = cache
+        self.max_text_size = max_text_size
+        self.buffer: list[str] = []
+        self.buffer_rows: list[int] = []
+        self.buffer_size = 0
+
+    @property
+    def text(self) -> str:
+        return "".join(self.buffer)
+
+    def add_text(self, text: str, row_count: int = 0) -> None:
+        # row_count is the number of rows the statements of the text were built
+        # from, which the shards of a sharded file are limited to
+
+        self.buffer.append(text)
+        self.buffer_rows.append(row_count)
+        self.buffer_size += len(text)
+
+        if self.file is not None and self.buffer_size >= self.flush_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if isinstance(self.file, ShardedWriter):
+            for text, row_count in zip(self.buffer, self.buffer_rows):
+                self.file.write(text, row_count)
+        else:
+            self.file.write(self.text)
+
+        self.buffer = []
+        self.buffer_rows = []
+        self.buffer_size = 0
+
+    def close(self) -> None:
+        self.flush()
+        self.file.close()
+
+    def __getstate__(self) -> dict:
+        return {
+            **self.__dict__,
+            "file": None,
+            "cache": None,
+            "buffer": [],
+            "buffer_rows": [],
+            "buffer_size": 0,
+        }
+
+    def add_tables(
+        self,
+        get_statements: Callable[..., str],
+        dfs: dict[str, pd.DataFrame | ChunkedCsv],
+        get_args: Callable[[str, pd.DataFrame | ChunkedCsv], tuple],
+        progress_bar: tqdm,
+        pool: WorkerPool | None = None,
+        is_chunked: bool = False,
+    ) -> None:
+        # chunks are converted on the pool and their statements added in order,
+        # followed by the table_separator of every table, tables with cached
+        # statements aren't read. is_chunked is whether the statements depend on
+        # how the tables are split into chunks, which is then part of their cache
+        # key. Statements that would take the entry past the cache's max_size aren't
+        # cached
+
+        pool = pool if pool is not None else WorkerPool()
+        cache_keys = {}
+
+        if self.cache is not None:
+            cache_keys = {
+                df_name: self.cache.get_key(
+                    get_statements.__name__,
+                    get_file_path(df),
+                    *get_args(df_name, df),
+                    *([pool.get_chunksize(df)] if is_chunked else []),
+                )
+                for df_name, df in dfs.items()
+            }
+
+        cached_df_names = {
+            df_name for df_name, key in cache_keys.items() if self.cache.has(key)
+        }
+        results = pool.map_chunks(
+            split_to_size,
+            dfs,
+            lambda df_name, df: (
+                self.max_text_size,
+                get_statements,
+                *get_args(df_name, df),
+            ),
+            cached_df_names,
+        )
+
+        for df_name, table_results in groupby(results, key=lambda result: result[0][0]):
+            key = cache_keys.get(df_name)
+
+            if df_name in cached_df_names:
+                for (_, row_count), _ in table_results:
+                    progress_bar.update(row_count)
+
+                for text in self.cache.read_entry(key):
+                    self.add_text(text)
+            else:
+                entry = self.cache.open_entry(key) if key is not None else None
+                entry_size = 0
+
+                for (_, row_count), pieces in table_results:
+                    progress_bar.update(row_count)
+
+                    for piece_row_count, statements in pieces:
+                        self.add_text(statements, piece_row_count)
+
+                        if entry is not None:
+                            entry_size += len(statements)
+
+                            if entry_size > self.cache.max_size:
+                                self.cache.discard_entry(key, entry)
+                                entry = None
+                            else:
+                                entry.write(statements)
+
+                if entry is not None:
+                    self.cache.close_entry(key, entry)
+
+            if self.table_separator:
+                self.add_text(self.table_separator)
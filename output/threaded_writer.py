@@ -0,0 +1,108 @@
+import bz2
+import gzip
+import queue
+import threading
+from typing import IO
+
+# file name suffix of the output compressed with each method
+
+compression_suffixes = {"gzip": ".gz", "bz2": ".bz2", "zstd": ".zst"}
+
+
+def open_compressed_file(file_path: str, compression: str) -> IO[bytes]:
+    match compression:
+        case "gzip":
+            return gzip.open(file_path, "wb", compresslevel=6)
+        case "bz2":
+            return bz2.open(file_path, "wb")
+        case "zstd":
+            try:
+                import zstandard
+            except ImportError:
+                raise ImportError(
+                    "zstd compression requires the zstandard package, install it "
+                    "with pip install zstandard"
+                )
+
+            return zstandard.ZstdCompressor().stream_writer(open(file_path, "wb"))
+        case _:
+            raise ValueError(f"Unknown compression {compression}")
+
+
+class ThreadedWriter:
+    """
+    Text file that compresses what is written to it on a background thread.
+
+    Written text is encoded and handed to the thread through a bounded queue, the
+    compressors release the GIL while compressing so it overlaps with generating
+    the next text instead of being a separate pass over the output.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        compression: str,
+        encoding: str = "utf-8",
+        queue_size: int = 16,
+    ):
+        self.encoding = encoding
+        self.queue: queue.Queue[bytes | None] = queue.Queue(queue_size)
+        self.error: BaseException | None = None
+        self.file = open_compressed_file(file_path, compression)
+        self.thread = threading.Thread(target=self.compress, daemon=True)
+        self.thread.start()
+
+    def compress(self):
+        # after an error the queue is still drained so writers never block on it,
+        # the error is raised by the next write or close
+
+        try:
+            while (data := self.queue.get()) is not None:
+                self.file.write(data)
+        except BaseException as error:
+            self.error = error
+
+            while self.queue.get() is not None:
+                pass
+        finally:
+            self.file.close()
+
+    def write(self, text: str) -> int:
+        if self.error is not None:
+            raise self.error
+
+        self.queue.put(text.encode(self.encoding))
+
+        return len(text)
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+def get_output_path(file_path: str, compression: str | None = None) -> str:
+    if compression is None:
+        return file_path
+
+    return file_path + compression_suffixes[compression]
+
+
+def open_output(
+    file_path: str, compression: str | None = None
+) -> IO[str] | ThreadedWriter:
+    # opens file_path for writing text, with a compression the text is written to
+    # get_output_path(file_path, compression) through a ThreadedWriter
+
+    if compression is None:
+        return open(file_path, "w", encoding="utf-8", newline="")
+
+    return ThreadedWriter(get_output_path(file_path, compression), compression)
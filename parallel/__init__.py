@@ -0,0 +1 @@
+from .worker_pool import WorkerPool
\ No newline at end of file
@@ -0,0 +1,272 @@
+import multiprocessing
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Hashable, Iterable, Iterator
+import pandas as pd
+from loader import ChunkedCsv, iter_chunks
+
+
+def timed_call(fn: Callable, *args) -> tuple[float, Any]:
+    # runs on the workers, returns the seconds fn took along with its result
+
+    start = time.perf_counter()
+    result = fn(*args)
+
+    return time.perf_counter() - start, result
+
+
+class WorkerPool:
+    """
+    Runs the per chunk conversions of the exporters on a pool of processes.
+
+    Results are yielded in the order the tasks were given, so writing them out as
+    they arrive produces the same output as a serial run. Only a few tasks per
+    worker are submitted ahead of the results being consumed, which keeps the
+    number of chunks held in memory bounded. With a single worker everything
+    runs in the calling process.
+
+    In pipeline mode the chunks are read on a thread of their own into a queue of
+    at most queue_size chunks, converted on the workers (a thread when there is a
+    single worker) and written out by the caller, so reading, converting and
+    writing overlap. In every mode the seconds spent reading chunks, converting
+    them and writing out the results are recorded to report the utilization of
+    each.
+    """
+
+    def __init__(
+        self,
+        workers: int = 1,
+        chunksize: int = 100_000,
+        pipeline: bool = False,
+        queue_size: int = 8,
+        always_split: bool = False,
+    ):
+        self.workers = workers
+        self.chunksize = chunksize
+        self.pipeline = pipeline
+        self.queue_size = queue_size
+        self.always_split = always_split
+        self.executor = None
+        self.reset_utilization()
+
+        if workers > 1:
+            # main.py runs at import time so the workers are forked rather than
+            # spawned, which would re-run it in every worker
+            context = (
+                multiprocessing.get_context("fork")
+                if "fork" in multiprocessing.get_all_start_methods()
+                else None
+            )
+            self.executor = ProcessPoolExecutor(workers, mp_context=context)
+        elif pipeline:
+            self.executor = ThreadPoolExecutor(1)
+
+    def get_chunksize(self, df: pd.DataFrame | ChunkedCsv) -> int | None:
+        # the rows of the chunks split divides a table into, None when it isn't
+        # divided. In memory dataframes are only split up when there are workers to
+        # share the chunks between, or with always_split so the output of a table
+        # can be divided between its chunks (e.g. into shards). Files are read in
+        # chunks of their own chunksize, which always_split bounds by the pool's
+
+        if getattr(df, "chunksize", None) is not None:
+            return (
+                min(df.chunksize, self.chunksize) if self.always_split else df.chunksize
+            )
+
+        if self.executor is not None or self.always_split:
+            return self.chunksize
+
+        return None
+
+    def split(self, df: pd.DataFrame | ChunkedCsv) -> Iterator[pd.DataFrame]:
+        return iter_chunks(df, self.get_chunksize(df))
+
+    def map(
+        self, fn: Callable, tasks: Iterable[tuple[Hashable, tuple]]
+    ) -> Iterator[tuple[Hashable, Any]]:
+        # tasks without args are passed through with a None result
+
+        if self.pipeline:
+            yield from self.map_pipelined(fn, tasks)
+            return
+
+        start = time.perf_counter()
+
+        try:
+            if self.executor is None:
+                for key, args in self.read_tasks(tasks):
+                    yield from self.get_result(
+                        key, timed_call(fn, *args) if args is not None else None
+                    )
+
+                return
+
+            pending = deque()
+
+            for key, args in self.read_tasks(tasks):
+                pending.append(
+                    (
+                        key,
+                        (
+                            self.executor.submit(timed_call, fn, *args)
+                            if args is not None
+                            else None
+                        ),
+                    )
+                )
+
+                if len(pending) >= 2 * self.workers:
+                    yield from self.get_result(*pending.popleft())
+
+            while pending:
+                yield from self.get_result(*pending.popleft())
+        finally:
+            self.wall_seconds += time.perf_counter() - start
+
+    def read_tasks(
+        self, tasks: Iterable[tuple[Hashable, tuple]]
+    ) -> Iterator[tuple[Hashable, tuple]]:
+        # the seconds spent getting every task, i.e. reading its chunk, are counted
+        # as reading
+
+        iterator = iter(tasks)
+
+        while True:
+            start = time.perf_counter()
+            task = next(iterator, None)
+            self.busy_seconds["read"] += time.perf_counter() - start
+
+            if task is None:
+                return
+
+            yield task
+
+    def get_result(
+        self, key: Hashable, result: Future | tuple[float, Any] | None
+    ) -> Iterator[tuple[Hashable, Any]]:
+        # result is the (seconds, result) of timed_call or a future of it, the
+        # caller writes the result out before asking for the next one
+
+        if result is not None:
+            seconds, result = result.result() if isinstance(result, Future) else result
+            self.busy_seconds["transform"] += seconds
+
+        start = time.perf_counter()
+        yield key, result
+        self.busy_seconds["write"] += time.perf_counter() - start
+
+    def map_pipelined(
+        self, fn: Callable, tasks: Iterable[tuple[Hashable, tuple]]
+    ) -> Iterator[tuple[Hashable, Any]]:
+        # the reader thread stops at the next task once the results stop being
+        # consumed, errors while reading are raised in the caller
+
+        task_queue = queue.Queue(self.queue_size)
+        stop = threading.Event()
+        end = object()
+
+        def put(item: Any):
+            while not stop.is_set():
+                try:
+                    task_queue.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+
+        def read_tasks():
+            try:
+                iterator = iter(tasks)
+
+                while not stop.is_set():
+                    start = time.perf_counter()
+                    task = next(iterator, end)
+                    self.busy_seconds["read"] += time.perf_counter() - start
+
+                    put(task)
+
+                    if task is end:
+                        return
+            except BaseException as error:
+                put(error)
+
+        start = time.perf_counter()
+        reader = threading.Thread(target=read_tasks, daemon=True)
+        reader.start()
+        pending = deque()
+
+        try:
+            while (task := task_queue.get()) is not end:
+                if isinstance(task, BaseException):
+                    raise task
+
+                key, args = task
+                future = None
+
+                if args is not None:
+                    future = self.executor.submit(timed_call, fn, *args)
+
+                pending.append((key, future))
+
+                if len(pending) >= 2 * self.workers:
+                    yield from self.get_result(*pending.popleft())
+
+            while pending:
+                yield from self.get_result(*pending.popleft())
+        finally:
+            stop.set()
+            reader.join()
+            self.wall_seconds += time.perf_counter() - start
+
+    def reset_utilization(self):
+        self.busy_seconds = {"read": 0.0, "transform": 0.0, "write": 0.0}
+        self.wall_seconds = 0.0
+
+    def get_utilization(self) -> dict[str, dict[str, float]]:
+        # the seconds every stage was busy and the fraction of the time spent in
+        # map that is, for the workers of the transform stage together
+
+        utilization = {}
+
+        for stage, busy_seconds in self.busy_seconds.items():
+            capacity = self.wall_seconds * (self.workers if stage == "transform" else 1)
+            utilization[stage] = {
+                "busy_seconds": busy_seconds,
+                "utilization": busy_seconds / capacity if capacity > 0 else 0.0,
+            }
+
+        return utilization
+
+    def map_chunks(
+        self,
+        fn: Callable,
+        dfs: dict[str, pd.DataFrame | ChunkedCsv],
+        get_args: Callable[[str, pd.DataFrame | ChunkedCsv], tuple] = lambda *_: (),
+        skip: set[str] = frozenset(),
+        prepare: Callable[[str, pd.DataFrame], pd.DataFrame] | None = None,
+    ) -> Iterator[tuple[tuple[str, int], Any]]:
+        # calls fn(chunk, *get_args(df_name, df)) for every chunk of every table and
+        # yields ((df_name, rows in chunk), result), tables in skip aren't read and
+        # yield ((df_name, rows in table), None) in their place. prepare(df_name,
+        # chunk) is run on every chunk where it is read, before it is sent to the
+        # workers
+
+        def get_tasks():
+            for df_name, df in dfs.items():
+                if df_name in skip:
+                    yield (df_name, len(df)), None
+                    continue
+
+                for chunk in self.split(df):
+                    if prepare is not None:
+                        chunk = prepare(df_name, chunk)
+
+                    yield (df_name, len(chunk)), (chunk, *get_args(df_name, df))
+
+        return self.map(fn, get_tasks())
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
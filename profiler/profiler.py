@@ -0,0 +1,229 @@
+import cProfile
+import glob
+import json
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+
+def get_file_sizes(path: str) -> dict[str, int]:
+    # size of a file, or of every file in a directory, by its path
+
+    if os.path.isfile(path):
+        return {path: os.path.getsize(path)}
+
+    return {
+        f"{dir_path}/{file_name}": os.path.getsize(f"{dir_path}/{file_name}")
+        for dir_path, _, file_names in os.walk(path)
+        for file_name in sorted(file_names)
+    }
+
+
+def get_rss_mb(pid: int | str = "self") -> float | None:
+    # current rss of a process, None where it can't be read from /proc
+
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize() / 2**20
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def get_child_pids() -> list[str]:
+    # the processes started by any thread of this process, e.g. the workers of a
+    # pool
+
+    pids = []
+
+    for file_path in glob.glob(f"/proc/{os.getpid()}/task/*/children"):
+        try:
+            with open(file_path) as f:
+                pids.extend(f.read().split())
+        except OSError:
+            pass
+
+    return pids
+
+
+class RssSampler:
+    """
+    Peak rss of the process and of its child processes together over a stage.
+
+    The rss is sampled on a thread every interval seconds while the stage runs,
+    since ru_maxrss only holds the peak of the whole run so far and leaves out
+    child processes that haven't exited, like the workers of a pool. Without
+    /proc the peaks fall back to ru_maxrss of the process and of its exited
+    children.
+    """
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak_rss_mb = 0.0
+        self.peak_children_rss_mb = 0.0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def sample(self):
+        rss_mb = get_rss_mb()
+
+        if rss_mb is None:
+            # ru_maxrss is in kilobytes on linux
+            self.peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            self.peak_children_rss_mb = (
+                resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+            )
+            return
+
+        children_rss_mb = sum(
+            [rss_mb or 0 for rss_mb in map(get_rss_mb, get_child_pids())]
+        )
+        self.peak_rss_mb = max(self.peak_rss_mb, rss_mb)
+        self.peak_children_rss_mb = max(self.peak_children_rss_mb, children_rss_mb)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        self.sample()
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self.sample()
+
+
+class Profiler:
+    """
+    Records wall and cpu time, rows processed, bytes written and the peak rss of
+    every stage of a run, e.g. loading each csv or an exporter, along with the
+    peak rss of its worker processes and the bytes of each file it wrote.
+
+    A disabled profiler only hands out a throwaway record per stage so the hooks
+    cost next to nothing. With a cprofile_path every stage also runs under cProfile
+    and the stats of the stage with the longest wall time are dumped to it.
+    """
+
+    def __init__(self, enabled: bool = False, cprofile_path: str | None = None):
+        self.enabled = enabled or cprofile_path is not None
+        self.cprofile_path = cprofile_path
+        self.records: list[dict] = []
+        self.hottest: tuple[float, dict, cProfile.Profile] | None = None
+
+    @contextmanager
+    def stage(
+        self,
+        name: str,
+        file_path: str | None = None,
+        output_paths: list[str] = [],
+    ) -> Iterator[dict]:
+        # the caller sets record["rows"] to the rows the stage processed, bytes
+        # written is the size of output_paths once the stage is done, which are
+        # listed by file
+
+        record = {"stage": name, "file": file_path, "rows": 0}
+
+        if not self.enabled:
+            yield record
+            return
+
+        profile = cProfile.Profile() if self.cprofile_path is not None else None
+        sampler = RssSampler()
+        sampler.start()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+
+        if profile is not None:
+            profile.enable()
+
+        try:
+            yield record
+        finally:
+            if profile is not None:
+                profile.disable()
+
+            wall_seconds = time.perf_counter() - wall_start
+            sampler.stop()
+            file_sizes = {
+                file_path: size
+                for path in output_paths
+                if os.path.exists(path)
+                for file_path, size in get_file_sizes(path).items()
+            }
+
+            record.update(
+                {
+                    "wall_seconds": wall_seconds,
+                    "cpu_seconds": time.process_time() - cpu_start,
+                    "rows_per_second": (
+                        record["rows"] / wall_seconds if wall_seconds > 0 else None
+                    ),
+                    "bytes_written": sum(file_sizes.values()),
+                    "peak_rss_mb": sampler.peak_rss_mb,
+                    "peak_children_rss_mb": sampler.peak_children_rss_mb,
+                }
+            )
+
+            if output_paths:
+                record["files"] = file_sizes
+            self.records.append(record)
+
+            if profile is not None and (
+                self.hottest is None or wall_seconds > self.hottest[0]
+            ):
+                self.hottest = (wall_seconds, record, profile)
+
+    def get_report(self) -> dict:
+        # the records of every stage and file plus their totals per stage
+
+        totals = {}
+
+        for record in self.records:
+            total = totals.setdefault(
+                record["stage"],
+                {
+                    "wall_seconds": 0,
+                    "cpu_seconds": 0,
+                    "rows": 0,
+                    "bytes_written": 0,
+                    "peak_rss_mb": 0,
+                    "peak_children_rss_mb": 0,
+                },
+            )
+
+            for field_name in ["wall_seconds", "cpu_seconds", "rows", "bytes_written"]:
+                total[field_name] += record[field_name]
+
+            for field_name in ["peak_rss_mb", "peak_children_rss_mb"]:
+                total[field_name] = max(total[field_name], record[field_name])
+
+        for total in totals.values():
+            total["rows_per_second"] = (
+                total["rows"] / total["wall_seconds"]
+                if total["wall_seconds"] > 0
+                else None
+            )
+
+        report = {"stages": totals, "records": self.records}
+
+        if self.hottest is not None:
+            report["cprofile"] = {
+                "stage": self.hottest[1]["stage"],
+                "file": self.hottest[1]["file"],
+                "path": self.cprofile_path,
+            }
+
+        return report
+
+    def save(self, file_path: str) -> None:
+        # cpu time is the main process' own, workers of a pool aren't included
+
+        with open(file_path, "w") as f:
+            json.dump(self.get_report(), f, indent=4)
+
+        if self.hottest is not None:
+            self.hottest[2].dump_stats(self.cprofile_path)
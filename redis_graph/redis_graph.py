@@ -1,165 +1,513 @@
 import os
+from itertools import groupby
+from typing import IO
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
+from cache import Manifest
+from data_cleaner import TableSchema, get_pd_object_type, infer_schema
+from loader import ChunkedCsv, get_file_path
+from output import ShardedWriter, open_output, split_to_size, write_shard_manifest
+from parallel import WorkerPool
+from validation import IdIndex, get_entity_name
 
 class RedisGraph:
     def __init__(
         self,
         graph_name: str,
-        node_dfs: dict[str, pd.DataFrame],
-        relation_dfs: dict[str, pd.DataFrame],
+        node_dfs: dict[str, pd.DataFrame | ChunkedCsv],
+        relation_dfs: dict[str, pd.DataFrame | ChunkedCsv],
         csvs_dir_path: str,
         is_undirected_graph: bool = False,
+        pool: WorkerPool | None = None,
+        schemas: dict[str, TableSchema] | None = None,
+        manifest: Manifest | None = None,
+        compression: str | None = None,
+        id_index: IdIndex | None = None,
+        max_shard_size: int | None = None,
+        max_shard_rows: int | None = None,
     ):
         self.script_text = f"redisgraph-bulk-insert {graph_name} --enforce-schema --skip-invalid-nodes --skip-invalid-edges"
         self.node_dfs = node_dfs
         self.relation_dfs = relation_dfs
         self.csvs_dir_path = csvs_dir_path
         self.is_undirected_graph = is_undirected_graph
-        self.in_out_relation_dfs = None
+        self.pool = pool if pool is not None else WorkerPool()
+        self.schemas = schemas if schemas is not None else {}
+        # with an id_index the ids are replaced by the dense integer codes of their
+        # nodes, which depend on every node table so nothing is reused from the
+        # manifest. With a max_shard_size or max_shard_rows every csv is split into
+        # numbered shards and the tables are always written in one pass too
+        self.is_sharded = max_shard_size is not None or max_shard_rows is not None
+        self.manifest = manifest if id_index is None and not self.is_sharded else None
+        # the bulk loader can't read compressed csvs, so only the id maps that are
+        # kept next to them are compressed
+        self.compression = compression
+        self.id_index = id_index
+        self.max_shard_size = max_shard_size
+        self.max_shard_rows = max_shard_rows
+        self.node_field_names: dict[str, dict[str, str]] = {}
+        self.edge_file_names: dict[tuple[str, ...], str] = {}
+        self.files: dict[str, IO[str] | ShardedWriter] = {}
+        self.edge_fragments: list[tuple[str, str]] = []
+
+        if id_index is not None:
+            self.script_text += " --id-type INTEGER"
+
+    def get_edge_file_name(
+        self, header: list[str], start_entity: str, end_entity: str
+    ) -> str:
+        # edge csvs are named after the entity their edges start from, a second
+        # relation starting from the same entity gets its own file instead of
+        # overwriting the first one
+
+        if tuple(header) not in self.edge_file_names:
+            taken_file_names = set(self.edge_file_names.values())
+            file_name = f"to_{start_entity}"
+
+            if file_name in taken_file_names:
+                file_name = f"to_{start_entity}_{end_entity}"
+
+            suffix = 2
+
+            while file_name in taken_file_names:
+                file_name = f"to_{start_entity}_{end_entity}_{suffix}"
+                suffix += 1
+
+            self.edge_file_names[tuple(header)] = file_name
+
+        return self.edge_file_names[tuple(header)]
+
+    @staticmethod
+    def get_csv_text(df: pd.DataFrame) -> str:
+        return df.to_csv(header=False, index=False)
+
+    @staticmethod
+    def get_header_text(header: list[str]) -> str:
+        return pd.DataFrame(columns=header).to_csv(index=False)
+
+    @staticmethod
+    def get_max_text_size(max_size: int | None, header: list[str]) -> int | None:
+        # the most csv text that fits in a shard after its header
+
+        if max_size is None:
+            return None
+
+        return max_size - ShardedWriter.get_size(RedisGraph.get_header_text(header))
+
+    @staticmethod
+    def get_relation_csv_texts(
+        df: pd.DataFrame, end_entity: str | None, max_size: int | None = None
+    ) -> list[tuple[str, str, int]]:
+        # csv text and row count of a chunk of relations per end entity, junction
+        # tables (no end_entity) are split by their collection field in a single
+        # groupby pass in order of first appearance, the start/end headers are only
+        # added when the text is written. With a max_size the text of an end entity
+        # is split into pieces that fit in a shard of at most max_size bytes
+
+        start_entity = df.columns[0].replace("_id", "").lower()
+
+        if end_entity is not None:
+            groups = [(end_entity, df)]
+        else:
+            groups = df[[df.columns[0], df.columns[-1]]].groupby(
+                df["collection"], sort=False
+            )
+
+        return [
+            (entity_name, text, row_count)
+            for entity_name, group in groups
+            for row_count, text in split_to_size(
+                group,
+                RedisGraph.get_max_text_size(
+                    max_size,
+                    [f":START_ID({start_entity})", f":END_ID({entity_name})"],
+                ),
+                RedisGraph.get_csv_text,
+            )
+        ]
+
+    @staticmethod
+    def get_code_column(codes: np.ndarray) -> pd.arrays.IntegerArray:
+        # int32 codes unless there are too many nodes, the -1 codes of values that
+        # aren't ids of nodes are left empty
+
+        dtype = np.int32 if len(codes) == 0 or codes.max() < 2**31 else np.int64
+
+        return pd.arrays.IntegerArray(codes.astype(dtype), codes == -1)
+
+    def compact_node_ids(self, df_name: str, df: pd.DataFrame) -> pd.DataFrame:
+        df = df.copy(deep=False)
+        df[df.columns[0]] = self.get_code_column(
+            self.id_index.get_codes(get_entity_name(df_name), df[df.columns[0]])
+        )
+
+        return df
+
+    def compact_edge_ids(self, df_name: str, df: pd.DataFrame) -> pd.DataFrame:
+        # like get_relation_csv_texts the end nodes of junction tables are in the
+        # last column and belong to the entity of their collection
+
+        df = df.copy(deep=False)
+        start_field_name = df.columns[0]
+        end_field_name = df.columns[1] if len(df.columns) == 2 else df.columns[-1]
+
+        start_codes = self.id_index.get_codes(
+            get_entity_name(start_field_name), df[start_field_name]
+        )
+
+        if len(df.columns) == 2:
+            end_codes = self.id_index.get_codes(
+                get_entity_name(end_field_name), df[end_field_name]
+            )
+        else:
+            end_codes = np.full(len(df), -1)
+            codes, collections = pd.factorize(df["collection"])
+
+            for code, collection in enumerate(collections):
+                rows = codes == code
+                end_codes[rows] = self.id_index.get_codes(
+                    get_entity_name(collection), df[end_field_name][rows]
+                )
+
+        df[start_field_name] = self.get_code_column(start_codes)
+        df[end_field_name] = self.get_code_column(end_codes)
+
+        return df
+
+    def write_id_maps(self):
+        # the original id of every code so the ids stay recoverable
+
+        os.makedirs(f"{self.csvs_dir_path}/redis_bulk_csvs/id_maps", exist_ok=True)
 
-    def update_in_out_relation_dfs(
+        for entity_name in self.id_index.get_entity_names():
+            with open_output(
+                f"{self.csvs_dir_path}/redis_bulk_csvs/id_maps/{entity_name}.csv",
+                self.compression,
+            ) as f:
+                for i, id_map in enumerate(self.id_index.get_id_maps(entity_name)):
+                    f.write(id_map.to_csv(header=i == 0, index=False))
+
+    def write_csv_text(
+        self, file_path: str, header: list[str], text: str, row_count: int
+    ):
+        # files are kept open until all csvs are written, the header is written when
+        # a file is first written to in this run. The csvs are always written
+        # uncompressed for the bulk loader, sharded files repeat the header at the
+        # start of every shard
+
+        if file_path not in self.files:
+            header_text = self.get_header_text(header)
+
+            if self.is_sharded:
+                self.files[file_path] = ShardedWriter(
+                    file_path,
+                    self.max_shard_size,
+                    self.max_shard_rows,
+                    header_text,
+                )
+            else:
+                self.files[file_path] = open(file_path, "w", encoding="utf-8")
+                self.files[file_path].write(header_text)
+
+        if self.is_sharded:
+            self.files[file_path].write(text, row_count)
+        else:
+            self.files[file_path].write(text)
+
+    def get_import_args(self, flag: str, label: str, file_path: str) -> str:
+        # the bulk loader takes the label of -n and the type of -r from the file
+        # name, which the numbered shards don't share with their csv, so every shard
+        # is listed with its label through -N or -R instead
+
+        if not self.is_sharded:
+            return f" {flag} {file_path}"
+
+        return "".join(
+            f" {flag.upper()} {label} {shard_path}"
+            for shard_path in (
+                self.files[file_path].paths if file_path in self.files else []
+            )
+        )
+
+    def write_in_out_relations(
         self,
         start_entity: str,
         end_entity: str,
-        df: pd.DataFrame,
-        out_edges_dfs: dict[str, pd.DataFrame],
-    ):
-        df1 = df.copy()
-        df2 = df.copy()
-
-        df1.rename(
-            {
-                df1.columns[0]: f":START_ID({start_entity})",
-                df1.columns[1]: f":END_ID({end_entity})",
-            },
-            inplace=True,
-            axis=1,
-        )
+        text: str,
+        row_count: int,
+        fragments_dir_path: str | None = None,
+    ) -> list[tuple[list[str], str, str, str]]:
+        # returns the (header, start entity, end entity, file path) of both files,
+        # with a fragments_dir_path the relations are written to their own files in
+        # it instead of the shared edge csvs
+
+        out_header = [f":START_ID({start_entity})", f":END_ID({end_entity})"]
+        in_header = [f":END_ID({start_entity})", f":START_ID({end_entity})"]
+        edge_files = []
+
+        for header, from_entity, to_entity, direction in [
+            (out_header, start_entity, end_entity, "out"),
+            (in_header, end_entity, start_entity, "in"),
+        ]:
+            file_name = self.get_edge_file_name(header, from_entity, to_entity)
+
+            if fragments_dir_path is None:
+                file_path = (
+                    f"{self.csvs_dir_path}/redis_bulk_csvs/edges/{file_name}.csv"
+                )
+            else:
+                file_path = (
+                    f"{fragments_dir_path}/{start_entity}_{end_entity}_{direction}.csv"
+                )
 
-        df2.rename(
-            {
-                df2.columns[1]: f":START_ID({end_entity})",
-                df2.columns[0]: f":END_ID({start_entity})",
-            },
-            inplace=True,
-            axis=1,
-        )
+            self.write_csv_text(file_path, header, text, row_count)
+            edge_files.append((header, from_entity, to_entity, file_path))
 
-        out_edges_dfs[f"to_{start_entity}"] = df1
-        out_edges_dfs[f"to_{end_entity}"] = df2
+        return edge_files
 
     def add_redis_types_to_fields(self):
         for df_name, df in tqdm(self.node_dfs.items(), desc="Node Dataframes"):
             # rename fields of node dfs
 
             old_to_updated_field_name = {}
+            schema = self.schemas.get(df_name)
+
+            if schema is None:
+                schema = infer_schema(df)
 
-            for field_name, field_type in dict(df.dtypes).items():
+            for field_name in df.columns:
                 if "id" in field_name.lower():
                     old_to_updated_field_name[field_name] = f":ID({df_name.lower()})"
                     continue
 
-                match str(field_type):
-                    case "int64":
-                        old_to_updated_field_name[field_name] = f"{field_name}:integer"
-                    case "bool":
-                        old_to_updated_field_name[field_name] = f"{field_name}:bool"
-                    case "datetime64":
-                        old_to_updated_field_name[field_name] = f"{field_name}:string"
-                    case "timedelta[ns]":
-                        old_to_updated_field_name[field_name] = f"{field_name}:string"
-                    case "category":
-                        old_to_updated_field_name[field_name] = f"{field_name}:string"
-                    case "float64":
-                        old_to_updated_field_name[field_name] = f"{field_name}:double"
-                    case "object":
-                        # basic data cleaning for fields of type object
-                        first_field_val = str(df[field_name].iloc[0])
-
-                        if first_field_val.isdigit():
-                            old_to_updated_field_name[
-                                field_name
-                            ] = f"{field_name}:integer"
-                        elif first_field_val.replace(".", "").isdigit():
-                            old_to_updated_field_name[
-                                field_name
-                            ] = f"{field_name}:double"
-                        else:
-                            old_to_updated_field_name[
-                                field_name
-                            ] = f"{field_name}:string"
-
-            df.rename(columns=old_to_updated_field_name, inplace=True)
-            self.node_dfs[df_name] = df
-
-        # rename fields of edge dfs
-
-        in_out_relation_dfs = {}
-
-        for df_name, df in tqdm(self.relation_dfs.items(), desc="Relation Dataframes"):
-            field_names = list(df.columns)
-            start_entity = field_names[0].replace("_id", "").lower()
-
-            if len(df.columns) == 2:
-                end_entity = field_names[1].replace("_id", "").lower()
-                self.update_in_out_relation_dfs(
-                    start_entity, end_entity, df, in_out_relation_dfs
+                old_to_updated_field_name[field_name] = get_pd_object_type(
+                    df, field_name, "redis", schema
                 )
 
-            if len(df.columns) == 3:
-                out_entities = list(set(df["collection"].values.tolist()))
+            self.node_field_names[df_name] = old_to_updated_field_name
+
+    def write_bulk_csvs(self):
+        # creating the directories for the csvs and the redis script/command to be saved
 
-                for entity_name in out_entities:
-                    collection_df = df.loc[df["collection"] == entity_name][
-                        [df.columns[0], df.columns[-1]]
-                    ].copy()
+        os.makedirs(f"{self.csvs_dir_path}/redis_bulk_csvs/nodes", exist_ok=True)
+        os.makedirs(f"{self.csvs_dir_path}/redis_bulk_csvs/edges", exist_ok=True)
 
-                    self.update_in_out_relation_dfs(
-                        start_entity, entity_name, collection_df, in_out_relation_dfs
-                    )
+        # add redis field data types to field names
 
-        # print("here", in_out_relation_dfs)
+        self.add_redis_types_to_fields()
 
-        self.in_out_relation_dfs = in_out_relation_dfs
+        # with a manifest only the csvs of new or modified tables are written, the
+        # relations of every table get their own files which are imported with -R so
+        # the files of unchanged tables can be kept
 
-    def write_bulk_csvs(self):
-        # append the command string used to run the import of the csvs into the redis bulk loader
+        unchanged_df_names = set()
 
-        for df_name in self.node_dfs:
-            self.script_text += (
-                f" -n {self.csvs_dir_path}/redis_bulk_csvs/nodes/{df_name}.csv"
+        if self.manifest is not None:
+            for dir_name, dfs in [
+                ("nodes", self.node_dfs),
+                ("edges", self.relation_dfs),
+            ]:
+                for df_name, df in dfs.items():
+                    record = self.manifest.get_record(
+                        "redisgraph", f"{dir_name}/{df_name}", get_file_path(df)
+                    )
+
+                    if record is not None:
+                        unchanged_df_names.add(df_name)
+
+            self.manifest.remove_stale(
+                "redisgraph",
+                {f"nodes/{df_name}" for df_name in self.node_dfs}
+                | {f"edges/{df_name}" for df_name in self.relation_dfs},
             )
 
-        for df_name in self.relation_dfs:
-            self.script_text += (
-                f" -r {self.csvs_dir_path}/redis_bulk_csvs/edges/{df_name}.csv"
+        # save csvs to appropriate directory, the chunks are converted to csv text
+        # on the pool and written in order with the renamed fields as the header
+
+        compact_node_ids = None
+        compact_edge_ids = None
+
+        if self.id_index is not None:
+            compact_node_ids = self.compact_node_ids
+            compact_edge_ids = self.compact_edge_ids
+
+            self.write_id_maps()
+
+        def get_node_header(df_name: str) -> list[str]:
+            field_names = self.node_field_names[df_name]
+
+            return [
+                field_names.get(field_name, field_name)
+                for field_name in self.node_dfs[df_name].columns
+            ]
+
+        for (df_name, _), pieces in self.pool.map_chunks(
+            split_to_size,
+            self.node_dfs,
+            lambda df_name, _: (
+                self.get_max_text_size(self.max_shard_size, get_node_header(df_name)),
+                self.get_csv_text,
+            ),
+            unchanged_df_names,
+            compact_node_ids,
+        ):
+            if pieces is None:
+                continue
+
+            for row_count, text in pieces:
+                self.write_csv_text(
+                    f"{self.csvs_dir_path}/redis_bulk_csvs/nodes/{df_name}.csv",
+                    get_node_header(df_name),
+                    text,
+                    row_count,
+                )
+
+        if self.manifest is not None:
+            for df_name, df in self.node_dfs.items():
+                if df_name not in unchanged_df_names:
+                    file_path = (
+                        f"{self.csvs_dir_path}/redis_bulk_csvs/nodes/{df_name}.csv"
+                    )
+
+                    self.manifest.set_record(
+                        "redisgraph",
+                        f"nodes/{df_name}",
+                        get_file_path(df),
+                        {"fragments": [file_path]},
+                    )
+
+        def get_end_entity(df_name: str, df: pd.DataFrame | ChunkedCsv) -> tuple:
+            if len(df.columns) == 2:
+                return (df.columns[1].replace("_id", "").lower(), self.max_shard_size)
+
+            return (None, self.max_shard_size)
+
+        relation_dfs = {
+            df_name: df
+            for df_name, df in self.relation_dfs.items()
+            if len(df.columns) in (2, 3)
+        }
+        relation_results = self.pool.map_chunks(
+            self.get_relation_csv_texts,
+            relation_dfs,
+            get_end_entity,
+            unchanged_df_names,
+            compact_edge_ids,
+        )
+
+        for df_name, table_results in tqdm(
+            groupby(relation_results, key=lambda result: result[0][0]),
+            desc="Relation Dataframes",
+            total=len(relation_dfs),
+        ):
+            start_entity = (
+                self.relation_dfs[df_name].columns[0].replace("_id", "").lower()
             )
 
-        # creating the directories for the csvs and the redis script/command to be saved
+            if self.manifest is None:
+                for _, texts in table_results:
+                    for end_entity, text, row_count in texts:
+                        self.write_in_out_relations(
+                            start_entity, end_entity, text, row_count
+                        )
 
-        os.makedirs(f"{self.csvs_dir_path}/redis_bulk_csvs/nodes", exist_ok=True)
-        os.makedirs(f"{self.csvs_dir_path}/redis_bulk_csvs/edges", exist_ok=True)
+                continue
 
-        with open(f"{self.csvs_dir_path}/redis_bulk_csvs/redis-command.txt", "w") as f:
-            f.write(self.script_text)
+            input_name = f"edges/{df_name}"
+            file_path = get_file_path(self.relation_dfs[df_name])
 
-        # add redis field data types to field names
+            if df_name in unchanged_df_names:
+                # the edge file names are handed out again in the same order as
+                # when the files were written so every relation keeps its type
 
-        self.add_redis_types_to_fields()
+                edge_files = self.manifest.get_record(
+                    "redisgraph", input_name, file_path
+                )["edges"]
+
+                for header, from_entity, to_entity, _ in edge_files:
+                    self.get_edge_file_name(header, from_entity, to_entity)
+            else:
+                fragments_dir_path = (
+                    f"{self.csvs_dir_path}/redis_bulk_csvs/edges/{df_name}"
+                )
+                os.makedirs(fragments_dir_path, exist_ok=True)
+
+                for old_file_name in os.listdir(fragments_dir_path):
+                    os.remove(f"{fragments_dir_path}/{old_file_name}")
+
+                edge_files = {}
+
+                for _, texts in table_results:
+                    for end_entity, text, row_count in texts:
+                        for edge_file in self.write_in_out_relations(
+                            start_entity,
+                            end_entity,
+                            text,
+                            row_count,
+                            fragments_dir_path,
+                        ):
+                            edge_files[edge_file[-1]] = edge_file
+
+                edge_files = list(edge_files.values())
+
+                self.manifest.set_record(
+                    "redisgraph",
+                    input_name,
+                    file_path,
+                    {
+                        "fragments": [edge_file[-1] for edge_file in edge_files],
+                        "edges": edge_files,
+                    },
+                )
+
+            for header, from_entity, to_entity, edge_file_path in edge_files:
+                self.edge_fragments.append(
+                    (
+                        self.get_edge_file_name(header, from_entity, to_entity),
+                        edge_file_path,
+                    )
+                )
 
-        # save csvs to appropriate directory
+        for f in self.files.values():
+            f.close()
 
-        for df_name, df in self.node_dfs.items():
-            df.to_csv(
-                f"{self.csvs_dir_path}/redis_bulk_csvs/nodes/{df_name}.csv", index=False
+        # the shards of every csv are listed with their rows and sizes
+
+        if self.is_sharded:
+            dir_path = f"{self.csvs_dir_path}/redis_bulk_csvs"
+
+            write_shard_manifest(
+                f"{dir_path}/shards.json",
+                {
+                    os.path.relpath(file_path, dir_path): f
+                    for file_path, f in self.files.items()
+                },
             )
 
-        for df_name, df in self.in_out_relation_dfs.items():
-            df.to_csv(
-                f"{self.csvs_dir_path}/redis_bulk_csvs/edges/{df_name}.csv", index=False
+        # append the command string used to run the import of the csvs into the redis bulk loader
+
+        for df_name in self.node_dfs:
+            self.script_text += self.get_import_args(
+                "-n",
+                df_name,
+                f"{self.csvs_dir_path}/redis_bulk_csvs/nodes/{df_name}.csv",
             )
 
+        if self.manifest is None:
+            for file_name in self.edge_file_names.values():
+                self.script_text += self.get_import_args(
+                    "-r",
+                    file_name,
+                    f"{self.csvs_dir_path}/redis_bulk_csvs/edges/{file_name}.csv",
+                )
+        else:
+            for file_name, file_path in self.edge_fragments:
+                self.script_text += f" -R {file_name} {file_path}"
+
+        with open(f"{self.csvs_dir_path}/redis_bulk_csvs/redis-command.txt", "w") as f:
+            f.write(self.script_text)
+
         print(
             "The CSVs and command line to import data using the RedisGraph Bulk Loader is saved in redis_bulk_csvs in your dataset directory."
         )
@@ -0,0 +1,3 @@
+from .id_index import IdIndex, get_entity_name
+from .sqlite_id_index import SqliteIdIndex
+from .validate_references import drop_invalid_rows, print_report, validate_references
\ No newline at end of file
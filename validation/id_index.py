@@ -0,0 +1,161 @@
+from typing import Iterator
+import numpy as np
+import pandas as pd
+from loader import ChunkedCsv, iter_chunks, select_columns
+
+
+def get_string_values(values: pd.Series | pd.Index) -> pd.Series | pd.Index:
+    # values as strings, columns that already hold strings aren't copied
+
+    if pd.api.types.infer_dtype(values, skipna=True) == "string":
+        return values
+
+    return values.astype(str)
+
+
+def get_entity_name(name: str) -> str:
+    # node tables, id fields (e.g. user_id) and collections name the same entity
+    # once lowercased, like the labels of the redis bulk csvs
+
+    return str(name).replace("_id", "").lower()
+
+
+class IdIndex:
+    """
+    Ids of the nodes of every entity, built from the first column of the node
+    tables.
+
+    The distinct ids of an entity are kept in a pandas Index whose hash table is
+    built once, so looking up a chunk of edge endpoints is a single vectorized
+    get_indexer call. Ids are matched as strings unless both sides are integers,
+    the same way the exporters write them. The position of an id in the index is
+    the dense integer code of its node.
+    """
+
+    def __init__(self, node_dfs: dict[str, pd.DataFrame | ChunkedCsv]):
+        self.ids: dict[str, pd.Index] = {}
+        self.string_ids: dict[str, pd.Index] = {}
+        self.duplicates: dict[str, np.ndarray] = {}
+
+        for df_name, df in node_dfs.items():
+            # only the id column of the table is read
+            ids = pd.concat(
+                [
+                    chunk[chunk.columns[0]]
+                    for chunk in iter_chunks(select_columns(df, [df.columns[0]]))
+                ],
+                ignore_index=True,
+            )
+
+            # every row whose id was already seen in an earlier row
+            self.duplicates[df_name] = (ids.duplicated() & ids.notna()).to_numpy()
+
+            entity_name = get_entity_name(df_name)
+            ids = pd.Index(ids.dropna().unique())
+
+            if entity_name in self.ids:
+                ids = self.ids[entity_name].append(ids).unique()
+
+            self.ids[entity_name] = ids
+
+    def get_entity_names(self) -> list[str]:
+        return list(self.ids)
+
+    def get_string_ids(self, entity_name: str) -> pd.Index:
+        if entity_name not in self.string_ids:
+            self.string_ids[entity_name] = pd.Index(
+                get_string_values(self.ids[entity_name]).unique()
+            )
+
+        return self.string_ids[entity_name]
+
+    def get_code_ids(self, entity_name: str) -> pd.Index:
+        # the ids whose positions are the codes of the entity's nodes
+
+        if pd.api.types.is_integer_dtype(self.ids[entity_name]):
+            return self.ids[entity_name]
+
+        return self.get_string_ids(entity_name)
+
+    def get_id_maps(self, entity_name: str) -> Iterator[pd.DataFrame]:
+        # the code and id of every node of the entity, in chunks
+
+        ids = self.get_code_ids(entity_name)
+
+        yield pd.DataFrame({"code": np.arange(len(ids)), "id": ids})
+
+    def get_codes(self, entity_name: str, values: pd.Series) -> np.ndarray:
+        # the dense integer code of the node every value is the id of, -1 for values
+        # that aren't ids of the entity. Missing values never are as the ids don't
+        # include them
+
+        ids = self.ids.get(entity_name)
+
+        if ids is None:
+            return np.full(len(values), -1)
+
+        if pd.api.types.is_integer_dtype(ids) and pd.api.types.is_integer_dtype(values):
+            return ids.get_indexer(values)
+
+        # the string ids of integer ids are in the same order so their positions
+        # are the same codes
+        ids = self.get_string_ids(entity_name)
+
+        if pd.api.types.infer_dtype(values, skipna=True) == "string":
+            return ids.get_indexer(values)
+
+        is_present = values.notna().to_numpy()
+        codes = ids.get_indexer(values.astype(str))
+        codes[~is_present] = -1
+
+        return codes
+
+    def close(self):
+        # the index is only held in memory, see SqliteIdIndex.close
+
+        pass
+
+    def contains(self, entity_name: str, values: pd.Series) -> np.ndarray:
+        return self.get_codes(entity_name, values) != -1
+
+    def get_valid_edges(self, df: pd.DataFrame) -> tuple[np.ndarray, dict[str, int]]:
+        # whether both endpoints of every edge of a chunk exist, and the number of
+        # dangling endpoints per entity. Like the exporters the first column holds
+        # the start nodes and the end nodes are those of the second column or, in
+        # three column junction tables, of the last column in the entity named by
+        # the collection field
+
+        counts = {}
+
+        def check(entity_name: str, values: pd.Series) -> np.ndarray:
+            is_valid = self.contains(entity_name, values)
+            dangling_count = int(len(is_valid) - is_valid.sum())
+
+            if dangling_count > 0:
+                counts[entity_name] = counts.get(entity_name, 0) + dangling_count
+
+            return is_valid
+
+        is_valid = check(get_entity_name(df.columns[0]), df[df.columns[0]])
+
+        if len(df.columns) != 3:
+            is_end_valid = check(get_entity_name(df.columns[1]), df[df.columns[1]])
+
+            return is_valid & is_end_valid, counts
+
+        is_end_valid = np.zeros(len(df), dtype=bool)
+        codes, collections = pd.factorize(df["collection"])
+
+        for code, collection in enumerate(collections):
+            rows = codes == code
+            is_end_valid[rows] = check(
+                get_entity_name(collection), df[df.columns[-1]][rows]
+            )
+
+        # rows without a collection have no end node to check against
+        missing_count = int((codes == -1).sum())
+
+        if missing_count > 0:
+            counts["collection"] = missing_count
+
+        return is_valid & is_end_valid, counts
@@ -0,0 +1,148 @@
+import json
+import os
+import sqlite3
+import tempfile
+from typing import Iterator
+import numpy as np
+import pandas as pd
+from loader import ChunkedCsv, iter_chunks, select_columns
+from .id_index import IdIndex, get_entity_name, get_string_values
+
+
+def get_lookup_values(values: pd.Series) -> list[str | None]:
+    # the values as the strings ids are matched as, None for missing values
+
+    is_present = values.notna().to_numpy()
+    strings = get_string_values(values).to_numpy(dtype=object)
+
+    return np.where(is_present, strings, None).tolist()
+
+
+class SqliteIdIndex(IdIndex):
+    """
+    IdIndex kept in a temporary sqlite file instead of memory, for node tables
+    with more ids than fit in it.
+
+    The distinct ids of every entity are a table whose rowid (less one) is the code
+    of their node, with a unique index on the ids. The node tables are inserted
+    chunk by chunk and the endpoints of every chunk of edges are looked up with a
+    join against it, so only sqlite's page cache and a chunk are held in memory
+    and the rest of the index stays on disk. Ids are always matched as strings,
+    which matches the same integer ids as IdIndex does.
+    """
+
+    def __init__(
+        self,
+        node_dfs: dict[str, pd.DataFrame | ChunkedCsv],
+        dir_path: str | None = None,
+        cache_size: int = 2**28,
+    ):
+        # the file is created in dir_path, the system's temporary directory by
+        # default, and removed by close. cache_size is sqlite's page cache in bytes
+
+        file_descriptor, self.file_path = tempfile.mkstemp(
+            ".sqlite", ".csv2graph_ids_", dir_path
+        )
+        os.close(file_descriptor)
+
+        self.tables: dict[str, str] = {}
+        self.duplicates: dict[str, np.ndarray] = {}
+        self.connection = sqlite3.connect(
+            self.file_path, isolation_level=None, check_same_thread=False
+        )
+
+        for pragma in [
+            "journal_mode = OFF",
+            "synchronous = OFF",
+            f"cache_size = {-cache_size // 1024}",
+            "locking_mode = EXCLUSIVE",
+        ]:
+            self.connection.execute(f"PRAGMA {pragma}")
+
+        for df_name, df in node_dfs.items():
+            entity_name = get_entity_name(df_name)
+
+            if entity_name not in self.tables:
+                self.tables[entity_name] = self.create_table(f"ids_{len(self.tables)}")
+
+            # the ids of the table alone, to find the rows whose id was already seen
+            # in an earlier row of it
+            table_name = self.create_table("table_ids")
+            duplicates = []
+
+            for chunk in iter_chunks(select_columns(df, [df.columns[0]])):
+                ids = get_lookup_values(chunk[chunk.columns[0]])
+                is_present = np.array([val is not None for val in ids], dtype=bool)
+                is_seen = self.lookup(table_name, ids) != -1
+                is_repeated = pd.Series(ids, dtype=object).duplicated().to_numpy()
+                duplicates.append((is_seen | is_repeated) & is_present)
+
+                self.connection.execute(
+                    f'INSERT OR IGNORE INTO "{table_name}" (id) '
+                    "SELECT value FROM json_each(?) WHERE value IS NOT NULL",
+                    (json.dumps(ids),),
+                )
+
+            self.duplicates[df_name] = np.concatenate(duplicates)
+
+            # in order of first appearance after the ids of earlier tables of the
+            # entity, like the codes of IdIndex
+            self.connection.execute(
+                f'INSERT OR IGNORE INTO "{self.tables[entity_name]}" (id) '
+                f'SELECT id FROM "{table_name}" ORDER BY code'
+            )
+            self.connection.execute(f'DROP TABLE "{table_name}"')
+
+    def create_table(self, table_name: str) -> str:
+        self.connection.execute(
+            f'CREATE TABLE "{table_name}" (code INTEGER PRIMARY KEY, id TEXT UNIQUE)'
+        )
+
+        return table_name
+
+    def lookup(self, table_name: str, values: list[str | None]) -> np.ndarray:
+        # the code of every value in the table, -1 for values that aren't in it. The
+        # values are passed as a single json array that is joined with the table,
+        # which is much faster than inserting them one by one
+
+        rows = self.connection.execute(
+            f'SELECT lookup.key, "{table_name}".code - 1 FROM json_each(?) AS lookup '
+            f'JOIN "{table_name}" ON "{table_name}".id = lookup.value',
+            (json.dumps(values),),
+        ).fetchall()
+
+        codes = np.full(len(values), -1)
+
+        if rows:
+            positions, found_codes = np.array(rows).T
+            codes[positions] = found_codes
+
+        return codes
+
+    def get_entity_names(self) -> list[str]:
+        return list(self.tables)
+
+    def get_id_maps(
+        self, entity_name: str, chunksize: int = 100_000
+    ) -> Iterator[pd.DataFrame]:
+        cursor = self.connection.execute(
+            f'SELECT code - 1, id FROM "{self.tables[entity_name]}" ORDER BY code'
+        )
+        is_empty = True
+
+        while rows := cursor.fetchmany(chunksize):
+            is_empty = False
+            yield pd.DataFrame(rows, columns=["code", "id"])
+
+        if is_empty:
+            yield pd.DataFrame(columns=["code", "id"])
+
+    def get_codes(self, entity_name: str, values: pd.Series) -> np.ndarray:
+        if entity_name not in self.tables:
+            return np.full(len(values), -1)
+
+        return self.lookup(self.tables[entity_name], get_lookup_values(values))
+
+    def close(self):
+        self.connection.close()
+        os.remove(self.file_path)
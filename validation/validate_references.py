@@ -0,0 +1,163 @@
+import os
+from typing import Callable, Iterator
+import numpy as np
+import pandas as pd
+from cache import Cache
+from loader import (
+    ChunkedCsv,
+    get_file_path,
+    is_columnar,
+    iter_chunks,
+    read_arrow_schema,
+    read_table,
+    write_arrow,
+)
+from .id_index import IdIndex
+
+
+def validate_references(
+    node_dfs: dict[str, pd.DataFrame | ChunkedCsv],
+    relation_dfs: dict[str, pd.DataFrame | ChunkedCsv],
+    index: IdIndex | None = None,
+) -> dict:
+    """
+    Check that every node id is unique and that every edge's endpoints are nodes.
+
+    :param node_dfs: dict, node tables by entity name
+    :param relation_dfs: dict, edge tables by name
+    :param index: IdIndex, ids of the node tables, built from node_dfs when not given
+    :return: dict, the number of duplicate ids per node table and the dangling edges
+        of every edge table, with the dangling endpoints per entity
+    """
+    index = index if index is not None else IdIndex(node_dfs)
+    report = {"duplicate_ids": {}, "dangling_edges": {}}
+
+    for df_name, is_duplicate in index.duplicates.items():
+        if is_duplicate.any():
+            report["duplicate_ids"][df_name] = int(is_duplicate.sum())
+
+    for df_name, df in relation_dfs.items():
+        if len(df.columns) < 2:
+            continue
+
+        dangling_count = 0
+        endpoint_counts = {}
+
+        for chunk in iter_chunks(df):
+            is_valid, counts = index.get_valid_edges(chunk)
+            dangling_count += int(len(is_valid) - is_valid.sum())
+
+            for entity_name, count in counts.items():
+                endpoint_counts[entity_name] = (
+                    endpoint_counts.get(entity_name, 0) + count
+                )
+
+        if dangling_count > 0:
+            report["dangling_edges"][df_name] = {
+                "edges": dangling_count,
+                "rows": len(df),
+                "endpoints": endpoint_counts,
+            }
+
+    return report
+
+
+def print_report(report: dict) -> None:
+    for df_name, count in report["duplicate_ids"].items():
+        print(f"{df_name}: {count} rows repeat the id of an earlier node")
+
+    for df_name, dangling_edges in report["dangling_edges"].items():
+        endpoints = ", ".join(
+            f"{entity_name}: {count}"
+            for entity_name, count in dangling_edges["endpoints"].items()
+        )
+
+        print(
+            f"{df_name}: {dangling_edges['edges']} of {dangling_edges['rows']} edges "
+            f"reference missing nodes ({endpoints})"
+        )
+
+    if not report["duplicate_ids"] and not report["dangling_edges"]:
+        print("Every node id is unique and every edge references existing nodes")
+
+
+def rewrite_table(
+    df: pd.DataFrame | ChunkedCsv,
+    get_rows: Callable[[pd.DataFrame, int], np.ndarray],
+    file_path: str,
+    chunksize: int | None = None,
+    cache: Cache | None = None,
+) -> pd.DataFrame | ChunkedCsv:
+    # writes the rows of every chunk selected by get_rows(chunk, offset of the
+    # chunk's first row) to file_path, given without an extension, and reads it
+    # back in place of the table. Tables read from Parquet, Feather or Arrow files
+    # are written in their format with their schema so the columns keep their
+    # types, other tables are written as csvs
+
+    def get_kept_chunks() -> Iterator[pd.DataFrame]:
+        offset = 0
+
+        for chunk in iter_chunks(df):
+            yield chunk.loc[get_rows(chunk, offset)]
+            offset += len(chunk)
+
+    if is_columnar(df):
+        source_path = get_file_path(df)
+        file_path += os.path.splitext(source_path)[1]
+
+        write_arrow(
+            get_kept_chunks(),
+            file_path,
+            read_arrow_schema(source_path, list(df.columns)),
+        )
+    else:
+        file_path += ".csv"
+
+        with open(file_path, "w", encoding="utf-8", newline="") as f:
+            for i, chunk in enumerate(get_kept_chunks()):
+                chunk.to_csv(f, header=i == 0, index=False)
+
+    return read_table(file_path, chunksize, cache)
+
+
+def drop_invalid_rows(
+    node_dfs: dict[str, pd.DataFrame | ChunkedCsv],
+    relation_dfs: dict[str, pd.DataFrame | ChunkedCsv],
+    report: dict,
+    index: IdIndex,
+    dir_path: str,
+    chunksize: int | None = None,
+    cache: Cache | None = None,
+) -> tuple[dict, dict]:
+    # the tables with duplicate node ids or dangling edges are written without
+    # those rows to files in dir_path and read in their place, so the cache and
+    # manifest records of the cleaned tables are keyed by their own contents. Of
+    # every id only its first node is kept
+
+    node_dfs = dict(node_dfs)
+    relation_dfs = dict(relation_dfs)
+
+    os.makedirs(f"{dir_path}/nodes", exist_ok=True)
+    os.makedirs(f"{dir_path}/edges", exist_ok=True)
+
+    for df_name in report["duplicate_ids"]:
+        is_duplicate = index.duplicates[df_name]
+
+        node_dfs[df_name] = rewrite_table(
+            node_dfs[df_name],
+            lambda chunk, offset: ~is_duplicate[offset : offset + len(chunk)],
+            f"{dir_path}/nodes/{df_name}",
+            chunksize,
+            cache,
+        )
+
+    for df_name in report["dangling_edges"]:
+        relation_dfs[df_name] = rewrite_table(
+            relation_dfs[df_name],
+            lambda chunk, _: index.get_valid_edges(chunk)[0],
+            f"{dir_path}/edges/{df_name}",
+            chunksize,
+            cache,
+        )
+
+    return node_dfs, relation_dfs